@@ -1,7 +1,7 @@
 import inspect
 import logging, os
 
-from source_framework.models.components import Project
+from source_framework.models.components import Project, SourceFile
 from source_framework.models.indexer import Indexed
 from .source_manager.source_indexer import SourceIndexer
 from . import generators
@@ -15,7 +15,7 @@ _init_config = {
 _source_indexer = None
 
 
-def init(path=None):
+def init(path=None, cache=True, workers=None, unload_threshold=None, search_index=False):
     global _init_config
     global _source_indexer
 
@@ -31,8 +31,11 @@ def init(path=None):
     else:
         _init_config['caller_path'] = os.path.realpath(script_path)
 
+    # files of at least unload_threshold bytes are freed after indexing
+    SourceFile.UNLOAD_THRESHOLD = unload_threshold
     SourceIndexer.prepare(_init_config)
-    _source_indexer = SourceIndexer()
+    # the trigram index for search is built by the first search, unless search_index is set
+    _source_indexer = SourceIndexer(use_cache=cache, workers=workers, search_index=search_index)
 
 
 def _check_initialized():
@@ -51,15 +54,40 @@ def find():
     return _source_indexer
 
 
-def from_this():
+def from_this(item=False):
     (frame, script_path, line_number,
      function_name, lines, index) = inspect.getouterframes(inspect.currentframe())[1]
     _check_initialized()
     indexer = _source_indexer
 
+    if item:
+        # the items around the line of the caller, the innermost item last
+        items = indexer.containing(line_number, os.path.realpath(script_path))
+        if len(items) == 0:
+            error_message = 'Trying to get the indexed items around line {0} of: {1}\n' \
+                            'But no indexed item contains this line'.format(line_number, script_path)
+            logging.error(error_message)
+            raise Exception(error_message)
+        return items
+
     return indexer.at_path(script_path)
 
 
+def refresh():
+    _check_initialized()
+    return _source_indexer.refresh()
+
+
+def search(text, items=True):
+    _check_initialized()
+    return _source_indexer.search(text, items)
+
+
+def search_regex(pattern, flags=0, items=True):
+    _check_initialized()
+    return _source_indexer.search_regex(pattern, flags, items)
+
+
 def current_project() -> Project:
     source_indexer = find()
     root_config = _source_indexer._get_root_config()
@@ -1,6 +1,6 @@
 import jinja2, yaml, os, re, json
-import logging, copy
-from ..utils.utils import LOG_CONSTANTS
+import logging, copy, bisect, collections, hashlib, sys, itertools
+from ..utils.utils import LOG_CONSTANTS, file_stat_key
 import inspect
 from .indexer import Printable, Matchable, Unique
 
@@ -25,6 +25,8 @@ class Container():
 
 
 class SourceComponent(Printable, Matchable, Unique):
+    # files and items use slots, folders and projects still have a dict
+    __slots__ = ('_name', '_path')
 
     # @property
     # def indexer(self):
@@ -114,6 +116,8 @@ class SourceComponent(Printable, Matchable, Unique):
         return os.path.exists(self.path)
 
 class IndexedSourceComponent(SourceComponent):
+    # the _index slot is declared by the subclasses, so files and items can share this base
+    __slots__ = ()
 
     @property
     def index(self):
@@ -124,6 +128,9 @@ class IndexedSourceComponent(SourceComponent):
         self._index = index
 
 
+_NOT_FOUND = object()
+
+
 class SourceComponentContainer():
 
     def __repr__(self):
@@ -171,6 +178,26 @@ class SourceComponentContainer():
     def ok(self):
         return self.scoped
 
+    def _stream(self):
+        return iter(self.scoped)
+
+    def stream(self, attr: str = None):
+        # yields the scoped components (or the given attribute of each) one at a time
+        for c in self._stream():
+            yield c if attr is None else getattr(c, attr)
+
+    def first(self, filter_func=None, default=None):
+        for c in self._stream():
+            if filter_func is None or filter_func(c):
+                return c
+        return default
+
+    def any(self, filter_func=None) -> bool:
+        return self.first(filter_func, default=_NOT_FOUND) is not _NOT_FOUND
+
+    def take(self, n: int) -> list:
+        return list(itertools.islice(self._stream(), n))
+
     @property
     def one(self):
         if len(self.scoped) == 0:
@@ -233,45 +260,163 @@ class SourceComponentContainer():
 
 
 
-class Source(str, Printable):
+class ParsedConfigCache():
+    # parsed yaml and json sources by the hash of their content
+    # config files are parsed again and again (indices, projects, root configs), now only once per content
 
-    def __init__(self, source):
-        if isinstance(source, Source):
-            source = source.source
-        self._source = source
-        self._current_line = 0
+    MAX_SIZE = 512
+    YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+    _parsed = collections.OrderedDict()
+
+    @classmethod
+    def load_yaml(cls, text: str):
+        return yaml.load(text, Loader=cls.YAML_LOADER)
+
+    @classmethod
+    def load(cls, text: str, parse_func):
+        key = (parse_func, hashlib.sha1(text.encode('utf8', 'surrogatepass')).digest())
+        if key in cls._parsed:
+            cls._parsed.move_to_end(key)
+            parsed = cls._parsed[key]
+        else:
+            parsed = parse_func(text)
+            cls._parsed[key] = parsed
+            if len(cls._parsed) > cls.MAX_SIZE:
+                cls._parsed.popitem(last=False)
+        # the configs are changed by the callers, so every caller gets its own copy
+        return copy.deepcopy(parsed)
+
+    @classmethod
+    def clear(cls):
+        cls._parsed.clear()
 
-        if isinstance(source, list):
-            source = ''.join(source)
 
-        self.lines = source.splitlines(keepends=True)
+class SourceBuffer():
+    # the immutable text shared by a source and all the sources sliced from it
+
+    # the line breaks python counts for the line numbers of frames, form feeds and the other
+    # str.splitlines breaks are part of the line
+    LINE_BREAK_REGEX = re.compile('\r\n|\r|\n')
+
+    def __init__(self, text: str):
+        self.text = text
+        self._line_offsets = None
+
+    @property
+    def line_offsets(self) -> list:
+        # offset of the start of every line in the text, built on first use
+        # a terminated last line is followed by the offset of the (empty) line after it
+        if self._line_offsets is None:
+            offsets = [0]
+            offsets.extend(m.end() for m in self.LINE_BREAK_REGEX.finditer(self.text))
+            self._line_offsets = offsets
+        return self._line_offsets
+
+    def line_index(self, offset: int) -> int:
+        # the (0 based) index of the line the offset is in
+        return bisect.bisect_right(self.line_offsets, offset) - 1
+
+    def __len__(self):
+        return len(self.text)
 
-        #TODO check if super call causes errors
-        super(str).__init__()
 
+class Source(Printable):
+    # a view on a range of a source buffer,
+    # slicing the lines of a source returns a new view on the same buffer instead of copying the text
+
+    def __init__(self, source, start: int = None, end: int = None):
+        if isinstance(source, Source):
+            buffer = source._buffer
+            start = source._start if start is None else start
+            end = source._end if end is None else end
+        else:
+            if isinstance(source, list):
+                source = ''.join(source)
+            buffer = SourceBuffer(str(source))
+
+        self._buffer = buffer
+        self._start = 0 if start is None else start
+        self._end = len(buffer) if end is None else end
+        self._current_line = 0
+
+    @property
+    def buffer(self) -> str:
+        # the complete text this source is a view on, use span for the range of this source
+        return self._buffer.text
+
+    @property
+    def span(self) -> tuple:
+        return self._start, self._end
 
     def __iter__(self):
-        return iter(self.lines)
+        return self.iter_lines()
 
     def __next__(self):
         self._current_line += 1
-        if self._current_line > len(self.lines):
+        if self._current_line > self.line_count:
             raise StopIteration
 
-        return self.lines[self._current_line]
+        return self[self._current_line]
+
+    # LINE TABLE
+    @property
+    def _first_line(self) -> int:
+        return self._buffer.line_index(self._start)
+
+    @property
+    def line_offsets(self) -> list:
+        # offset (in the buffer) of the start of every line in the source
+        offsets = self._buffer.line_offsets
+        first_line = self._first_line
+        return offsets[first_line:first_line + self.line_count]
+
+    @property
+    def line_count(self) -> int:
+        if self._end <= self._start:
+            return 0
+        return bisect.bisect_left(self._buffer.line_offsets, self._end) - self._first_line
+
+    def line_number(self, offset: int) -> int:
+        # the (1 based) number of the line the offset (in the buffer) is in
+        return bisect.bisect_right(self._buffer.line_offsets, offset) - self._first_line
+
+    def _line_span(self, line_index: int):
+        offsets = self._buffer.line_offsets
+        start = offsets[line_index]
+        end = offsets[line_index + 1] if line_index + 1 < len(offsets) else len(self._buffer)
+        return max(start, self._start), min(end, self._end)
+
+    def iter_lines(self, start: int = 0, stop: int = None):
+        # iterates over a range of lines, only the lines themselves are copied out of the buffer
+        line_count = self.line_count
+        if stop is None or stop > line_count:
+            stop = line_count
+        text = self._buffer.text
+        first_line = self._first_line
+        for i in range(first_line + start, first_line + stop):
+            line_start, line_end = self._line_span(i)
+            yield text[line_start:line_end]
+
+    @property
+    def lines(self) -> list:
+        return list(self.iter_lines())
 
     # PROPERTIES (maybe split this up in source loaders module
     @property
-    def source(self):
-        return ''.join(self.lines)
+    def source(self) -> str:
+        text = self._buffer.text
+        if self._start == 0 and self._end == len(text):
+            return text
+        return text[self._start:self._end]
 
     @property
     def json(self):
-        return json.loads(self.source)
+        return ParsedConfigCache.load(self.source, json.loads)
 
     @property
     def yaml(self):
-        return yaml.load(self.source)
+        return ParsedConfigCache.load(self.source, ParsedConfigCache.load_yaml)
 
     @property
     def template(self):
@@ -279,21 +424,71 @@ class Source(str, Printable):
 
     # BUILTINS
     def _slice(self, start, stop):
-        return Source(self.lines[start: stop])
+        start, stop, step = slice(start, stop).indices(self.line_count)
+        if stop <= start:
+            return Source(self, self._end, self._end)
+
+        first_line = self._first_line
+        view_start = self._line_span(first_line + start)[0]
+        view_end = self._end if stop == self.line_count else self._line_span(first_line + stop)[0]
+        return Source(self, view_start, view_end)
 
     def __str__(self):
         return self.source
 
+    def __repr__(self):
+        return repr(self.source)
+
+    def __len__(self):
+        return self._end - self._start
+
+    def __bool__(self):
+        return self._end > self._start
+
+    def __eq__(self, other):
+        if isinstance(other, (Source, str)):
+            return self.source == str(other)
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.source)
+
+    def __contains__(self, item):
+        return self._buffer.text.find(str(item), self._start, self._end) != -1
+
+    def __add__(self, other):
+        return self.source + str(other)
+
+    def __radd__(self, other):
+        return str(other) + self.source
+
+    def __getattr__(self, attr):
+        # the other str methods (count, startswith, split, ...) work on the text of the view
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+        return getattr(self.source, attr)
+
     def __getitem__(self, item):
         if isinstance(item, slice):
             return self._slice(item.start, item.stop)
-        return self.lines[item]
+        line_count = self.line_count
+        if item < 0:
+            item += line_count
+        if not 0 <= item < line_count:
+            raise IndexError('source line index out of range')
+        line_start, line_end = self._line_span(self._first_line + item)
+        return self._buffer.text[line_start:line_end]
 
     def __setitem__(self, key, value):
 
         #todo
+        # the buffer is shared, so replacing a line copies the text into a new buffer
         if isinstance(key, int):
-            self.lines[key] = value
+            lines = self.lines
+            lines[key] = value
+            self._buffer = SourceBuffer(''.join(lines))
+            self._start = 0
+            self._end = len(self._buffer)
 
     #HELPERS
     @property
@@ -365,6 +560,48 @@ class Source(str, Printable):
 
 
 
+class FolderListing():
+    # one scandir of a folder, valid as long as the mtime of the folder does not change
+    # the entry types come from the dir entries, the names are sorted for prefix lookups
+
+    def __init__(self, path):
+        self.mtime_ns = os.stat(path).st_mtime_ns
+        entries = []
+        with os.scandir(path) as scandir_iterator:
+            for entry in scandir_iterator:
+                if entry.name.startswith('.'):
+                    continue
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                entries.append((entry.name, is_dir))
+        entries.sort()
+        self.names = [i[0] for i in entries]
+        self.dir_names = [i[0] for i in entries if i[1]]
+        self.file_names = [i[0] for i in entries if not i[1]]
+        self._is_dir = dict(entries)
+
+    def is_valid(self, path):
+        try:
+            return os.stat(path).st_mtime_ns == self.mtime_ns
+        except OSError:
+            return False
+
+    def is_dir(self, name):
+        return self._is_dir[name]
+
+    @staticmethod
+    def starting_with(names, prefix):
+        # names is sorted, so all names with the prefix are next to each other
+        matches = []
+        for i in range(bisect.bisect_left(names, prefix), len(names)):
+            if not names[i].startswith(prefix):
+                break
+            matches.append(names[i])
+        return matches
+
+
 #TODO WIP
 class Folder(SourceComponent):
 
@@ -377,27 +614,50 @@ class Folder(SourceComponent):
             else:
                 path = os.path.dirname(path)
         self.path = os.path.realpath(path)
+        self._listing = None
+        # child components by name, created on first access and kept while the entry exists
+        self._children = {}
+
+    @property
+    def listing(self) -> FolderListing:
+        if self._listing is None or not self._listing.is_valid(self.path):
+            self._listing = FolderListing(self.path)
+            self._children = {k: v for k, v in self._children.items()
+                              if k in self._listing._is_dir and self._listing.is_dir(k) == isinstance(v, Folder)}
+        return self._listing
+
+    def _child(self, name):
+        if name not in self._children:
+            path = os.path.join(self.path, name)
+            if self.listing.is_dir(name):
+                self._children[name] = Folder(name, path)
+            else:
+                self._children[name] = SourceFile(name, path)
+        return self._children[name]
+
     @property
     def items(self):
-        return [SourceComponent.from_path(os.path.join(self.path, i)) for i in os.listdir(self.path) if not i.startswith('.')]
+        return [self._child(i) for i in self.listing.names]
 
     @property
     def files(self):
-        return list(filter(lambda x: not os.path.isdir(x.path), self.items))
+        return [self._child(i) for i in self.listing.file_names]
 
     @property
     def dirs(self):
-        return list(filter(lambda x: os.path.isdir(x.path), self.items))
+        return [self._child(i) for i in self.listing.dir_names]
 
     def __getattr__(self, name):
-        items_starting_with = [i for i in self.items if i.name.startswith(name)]
+        if name.startswith('_'):
+            raise AttributeError(name)
+        items_starting_with = FolderListing.starting_with(self.listing.names, name)
 
         if len(items_starting_with) > 1:
             raise Exception('multiple items with same name')
         if len(items_starting_with) == 0:
             raise AttributeError('no items with found with name {0} at path: {1}'.format(name, self.path))
 
-        match_item = items_starting_with[0]
+        match_item = self._child(items_starting_with[0])
         logging.info('get item: {0}'.format(match_item))
 
         return match_item
@@ -407,7 +667,7 @@ class Folder(SourceComponent):
         return new_folder
 
     def get_folder(self, name):
-        items_starting_with = [i for i in self.dirs if i.name.startswith(name)]
+        items_starting_with = [self._child(i) for i in FolderListing.starting_with(self.listing.dir_names, name)]
         if len(items_starting_with) > 1:
             raise Exception('Error getting folder, multiple items with same name')
         if len(items_starting_with) == 0:
@@ -417,12 +677,12 @@ class Folder(SourceComponent):
         return match_item
 
     def get_file(self, name):
-        items_starting_with = [i for i in self.files if i.filename.startswith(name)]
+        items_starting_with = [self._child(i) for i in FolderListing.starting_with(self.listing.file_names, name)]
 
         if len(items_starting_with) > 1:
             raise Exception('multiple items with same name')
         if len(items_starting_with) == 0:
-            raise AttributeError('no items with found with name {0}\nAt path: {1}\nFiles available: {2}'.format(name, self.path, [i.filename for i in self.files]))
+            raise AttributeError('no items with found with name {0}\nAt path: {1}\nFiles available: {2}'.format(name, self.path, self.listing.file_names))
 
         match_item = items_starting_with[0]
         return match_item
@@ -455,7 +715,7 @@ class Folder(SourceComponent):
 
     def __repr__(self):
         try:
-            return '[Folder: >> {0} <<, {1} items]'.format(os.path.basename(self.name), len(self.items))
+            return '[Folder: >> {0} <<, {1} items]'.format(os.path.basename(self.name), len(self.listing.names))
         except FileNotFoundError:
             return '[Virtual folder >> {0} << at {1}]'.format(os.path.basename(self.name), self.path)
 
@@ -463,15 +723,68 @@ class Folder(SourceComponent):
 
 class SourceFile(SourceComponent):
 
+    __slots__ = ('_loaded_source', '_loaded_from_disk', '_loaded_stat', '_cached_source')
+
+    # files of at least this size (in bytes) are unloaded after their items are extracted, None keeps them loaded
+    UNLOAD_THRESHOLD = None
 
     def __init__(self, name: str, path: str, source : str= None):
         self.name = name
         self.path = os.path.realpath(path)
-        if source is None:
-            self._source = self._load_source(self.path)
-        else:
-            self._source = source
+        # the source is read from the path on first access
+        self._loaded_source = source
+        self._loaded_from_disk = False
+        # mtime and size of the file when the source was read
+        self._loaded_stat = None
+        self._cached_source = None
+
+    @property
+    def _source(self):
+        if self._loaded_source is None:
+            self._load()
+        return self._loaded_source
+
+    @_source.setter
+    def _source(self, source):
+        self._loaded_source = source
+        self._loaded_from_disk = False
+        self._loaded_stat = None
+
+    def _load(self):
+        self._loaded_stat = file_stat_key(self.path)
+        self._loaded_source = self._load_source(self.path)
+        self._loaded_from_disk = True
 
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_source is not None
+
+    def unload(self):
+        # frees the source read from disk, it is read again on the next access
+        if self._loaded_from_disk:
+            self._loaded_source = None
+            self._cached_source = None
+            self._loaded_from_disk = False
+            self._loaded_stat = None
+        return self
+
+    def invalidate(self):
+        # drops the cached source object, it is created again from the loaded source on the next access
+        self._cached_source = None
+        return self
+
+    def _saved(self):
+        # the loaded source is now the source on disk
+        self._loaded_from_disk = True
+        self._loaded_stat = file_stat_key(self.path)
+        return self
+
+    @property
+    def unload_after_indexing(self) -> bool:
+        # the size of the file when it was read, big files are read again when their source is needed
+        if self.UNLOAD_THRESHOLD is None or not self._loaded_from_disk or self._loaded_stat is None:
+            return False
+        return self._loaded_stat[1] >= self.UNLOAD_THRESHOLD
 
     @classmethod
     def _load_source(cls, path: str):
@@ -505,7 +818,17 @@ class SourceFile(SourceComponent):
 
     @property
     def source(self) -> Source:
-        return Source(self._source)
+        # the source object (and its line table) is cached until the source is replaced or saved,
+        # or the file changed on disk since it was read
+        if self._loaded_from_disk and file_stat_key(self.path) != self._loaded_stat:
+            logging.info('file changed on disk, reading it again: {0}'.format(self.path))
+            self.unload()
+
+        cached = self._cached_source
+        if cached is None or cached[0] is not self._source:
+            cached = (self._source, Source(self._source))
+            self._cached_source = cached
+        return cached[1]
 
 
 
@@ -530,7 +853,7 @@ class SourceFile(SourceComponent):
                 +LOG_CONSTANTS.LINE.format('') \
                + LOG_CONSTANTS.LINE.format('') \
                +LOG_CONSTANTS.REGION.format('SOURCE') \
-                +LOG_CONSTANTS.LINE.format(self.source._source) \
+                +LOG_CONSTANTS.LINE.format(self.source.source) \
                 + LOG_CONSTANTS.REGION.format('SOURCE FILE END')
 
 
@@ -539,14 +862,17 @@ class SourceFile(SourceComponent):
 from .indexer import Index
 class IndexedFile(SourceFile, IndexedSourceComponent):
 
+    __slots__ = ('_index',)
+
     # MANAGER = FileManager
 
     def __init__(self, name: str, path: str, index: Index, source=None):
         self.index = index
         super().__init__(name, path, source=source)
 
-    def __eq__(self, other):
-        return self.name == other.name and self.index == other.index
+    @property
+    def key(self) -> tuple:
+        return 'IndexedFile', self.index.key, self.path
 
     def __repr__(self):
         return self._print
@@ -578,30 +904,62 @@ class IndexedFile(SourceFile, IndexedSourceComponent):
 
     @classmethod
     def from_source_file(cls, file: SourceFile, index):
-        return cls(file.name, file.path, index)
+        # reuse the source if the file is already loaded
+        return cls(file.name, file.path, index, source=file._loaded_source)
+
 
 
 
+class PropertyLayout():
+    # the names of the item properties, shared by all items with the same property names
+    # the items only keep a tuple with the values
+
+    __slots__ = ('names', 'positions')
+
+    _layouts = {}
+
+    def __init__(self, names: tuple):
+        self.names = names
+        self.positions = {k: i for i, k in enumerate(names)}
+
+    @classmethod
+    def get(cls, names) -> 'PropertyLayout':
+        names = tuple(names)
+        layout = cls._layouts.get(names)
+        if layout is None:
+            names = tuple(sys.intern(i) for i in names)
+            layout = cls(names)
+            cls._layouts[names] = layout
+        return layout
+
 
 class IndexedItem(IndexedSourceComponent):
 
+    __slots__ = ('_index', 'indexed_file', 'line_start', 'line_end', '_source', '_layout', '_values')
+
     def __init__(self, name: str, indexed_file: IndexedFile, line_start: int, line_end: int, index , properties: dict = None):
         self.line_start = line_start
         self.line_end = line_end
         self.name = name
         self.indexed_file = indexed_file
         self._source = None
-        if properties is not None:
-            for k, v in properties.items():
-                setattr(self, k, v)
+        properties = properties or {}
+        self._layout = PropertyLayout.get(properties.keys())
+        self._values = tuple(properties.values())
         self.index = index
 
 
-    def __eq__(self, other):
-        return self.name == other.name and self.index == other.index
+    @property
+    def key(self) -> tuple:
+        return 'IndexedItem', self.index.key, self.indexed_file.path, self.line_start, self.line_end
 
-    #helper to acces indexed file attributes
+    #helper to acces the properties and the indexed file attributes
     def __getattr__(self, item):
+        if item in IndexedItem.__slots__:
+            raise AttributeError(item)
+        position = self._layout.positions.get(item)
+        if position is not None:
+            return self._values[position]
         return getattr(self.indexed_file, item)
 
     def __repr__(self):
@@ -618,6 +976,11 @@ class IndexedItem(IndexedSourceComponent):
     def file(self):
         return self.indexed_file
 
+    @property
+    def properties(self) -> dict:
+        # the named tags matched by the start identifier
+        return dict(zip(self._layout.names, self._values))
+
     @property
     def source(self):
         if self._source is None:
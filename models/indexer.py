@@ -8,12 +8,26 @@ IGNORE_IDENTIFIER = 'ignore.index'
 PROJECT_IDENTIFIER = 'root.config'
 
 class Unique():
+    __slots__ = ()
+
+    # the identity of the component, components with the same key are equal
+    @property
+    def key(self) -> tuple:
+        return self.__class__.__name__, self.path
+
     def __hash__(self):
-        return '{0}-{1}-{2}'.format(self.__class__.__name__, self.name, self.path)
+        return hash(self.key)
+
+    def __eq__(self, other):
+        if not isinstance(other, Unique):
+            return NotImplemented
+        return self.key == other.key
 
 
 
 class Matchable():
+    __slots__ = ()
+
     def match(self, query):
 
         if isinstance(self, Index):
@@ -28,6 +42,7 @@ class Matchable():
 
 
 class Printable():
+    __slots__ = ()
 
     def print(self):
         print(self._print)
@@ -46,7 +61,8 @@ class Printable():
 class Index(Matchable, Printable):
 
 
-    def __init__(self, index_type: str, config_file, name=None):
+    def __init__(self, index_type: str, config_file, name=None, config: dict = None):
+        # config overrides the parsed config of the config file, used for the merged configs
 
         if name is None:
             name = config_file.name
@@ -55,7 +71,9 @@ class Index(Matchable, Printable):
 
         self.index_type = index_type
         self.config_file = config_file
-        self.config = config_file.yaml
+        self.config = config if config is not None else config_file.yaml
+        # compiled identifiers of item indices, see ItemMatcher in the source indexer
+        self.matcher = None
 
         # assert isinstance(config_file, SourceFile)
         if name == 'root':
@@ -87,8 +105,17 @@ class Index(Matchable, Printable):
             raise Exception(error_message)
 
 
+    @property
+    def key(self) -> tuple:
+        return self.name, self.index_type
+
     def __eq__(self, other):
-        return self.name == other.name and self.index_type == other.index_type
+        if not isinstance(other, Index):
+            return NotImplemented
+        return self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
 
 
     def print_row(self):
@@ -258,6 +285,15 @@ class Indexed(Printable, SourceComponentContainer):
         self.current = -1
 
 
+    @classmethod
+    def _from_components(cls, components: list):
+        # wraps a list of unpacked components (or mapped values) without unpacking and copying it
+        indexed = cls.__new__(cls)
+        indexed._components = components
+        indexed.scoped = components
+        indexed.current = -1
+        return indexed
+
     def __getitem__(self, item):
         if isinstance(item, slice):
             return self.scoped[item.start: item.stop]
@@ -0,0 +1,332 @@
+import bisect
+import logging
+import os
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .components import IndexedSourceComponent, IndexedItem, Project
+
+
+class ItemIntervals():
+    # static centered interval tree over the line ranges of the items of one file
+    # a line is in an item when line_start <= line <= line_end, the lookups return the items sorted by line_start
+
+    def __init__(self, items: list):
+        # items with the same line start keep their order
+        self.items = sorted(items, key=lambda x: x.line_start)
+        self._starts = [i.line_start for i in self.items]
+        self._ends = [i.line_end for i in self.items]
+        self._by_end = sorted(range(len(self.items)), key=lambda i: self._ends[i])
+        self._sorted_ends = [self._ends[i] for i in self._by_end]
+        self._tree = self._build(list(range(len(self.items))))
+
+    def __len__(self):
+        return len(self.items)
+
+    def _build(self, positions):
+        # node: (center, positions around the center by start, the same by end descending, left node, right node)
+        if not positions:
+            return None
+        middle = positions[len(positions) // 2]
+        center = (self._starts[middle] + self._ends[middle]) // 2
+
+        left = [i for i in positions if self._ends[i] < center]
+        right = [i for i in positions if self._starts[i] > center]
+        around = [i for i in positions if self._starts[i] <= center <= self._ends[i]]
+        by_end = sorted(around, key=lambda i: self._ends[i], reverse=True)
+        return center, around, by_end, self._build(left), self._build(right)
+
+    def _items(self, positions):
+        return [self.items[i] for i in sorted(positions)]
+
+    def containing(self, line: int) -> list:
+        positions = []
+        node = self._tree
+        while node is not None:
+            center, by_start, by_end, left, right = node
+            if line < center:
+                for i in by_start:
+                    if self._starts[i] > line:
+                        break
+                    positions.append(i)
+                node = left
+            elif line > center:
+                for i in by_end:
+                    if self._ends[i] < line:
+                        break
+                    positions.append(i)
+                node = right
+            else:
+                positions.extend(by_start)
+                break
+        return self._items(positions)
+
+    def overlapping(self, line_start: int, line_end: int) -> list:
+        # the items sharing a line with the lines from line_start up to and including line_end
+        positions = []
+        nodes = [self._tree]
+        while nodes:
+            node = nodes.pop()
+            if node is None:
+                continue
+            center, by_start, by_end, left, right = node
+            if line_end < center:
+                for i in by_start:
+                    if self._starts[i] > line_end:
+                        break
+                    positions.append(i)
+                nodes.append(left)
+            elif line_start > center:
+                for i in by_end:
+                    if self._ends[i] < line_start:
+                        break
+                    positions.append(i)
+                nodes.append(right)
+            else:
+                positions.extend(by_start)
+                nodes.append(left)
+                nodes.append(right)
+        return self._items(positions)
+
+    def next(self, line: int):
+        # the first item starting after the line
+        i = bisect.bisect_right(self._starts, line)
+        return self.items[i] if i < len(self.items) else None
+
+    def previous(self, line: int):
+        # the item that ended last before the line
+        i = bisect.bisect_left(self._sorted_ends, line) - 1
+        return self.items[self._by_end[i]] if i >= 0 else None
+
+
+class ComponentTable():
+    # the indexed components by row, so the common queries do not call python code per component
+    # a row is the position of the component in the components list, the table never changes after it is built
+    # the rows of every name, path, index, type and project are kept (sorted), lookups are dict hits
+    # the line columns use numpy masks when numpy is installed, otherwise plain loops over arrays
+
+    NO_ID = -1
+
+    def __init__(self, components: list):
+        self.components = components
+        # the list can be extended after the table is built, see SourceIndexer._get_table
+        self.size = len(components)
+
+        self.names = []
+        self.paths = []
+        self.indices = []
+        self.types = []
+        name_ids = {}
+        path_ids = {}
+        index_ids = {}
+        type_ids = {}
+
+        type_column = array('l')
+        name_column = array('l')
+        path_column = array('l')
+        index_column = array('l')
+        line_start_column = array('l')
+        line_end_column = array('l')
+
+        for c in components:
+            type_column.append(self._intern(type(c), type_ids, self.types))
+            name_column.append(self._intern(c.name, name_ids, self.names))
+            path_column.append(self._intern(c.path, path_ids, self.paths))
+            if isinstance(c, IndexedSourceComponent):
+                index_column.append(self._intern(c.index, index_ids, self.indices, key=id(c.index)))
+            else:
+                index_column.append(self.NO_ID)
+            if isinstance(c, IndexedItem):
+                line_start_column.append(c.line_start)
+                line_end_column.append(c.line_end)
+            else:
+                line_start_column.append(self.NO_ID)
+                line_end_column.append(self.NO_ID)
+
+        self._name_ids = name_ids
+        self._path_ids = path_ids
+        # item interval trees by path, built on first use
+        self._intervals = {}
+        # the distinct paths sorted, the paths under a dir are next to each other
+        self._sorted_paths = sorted(self.paths)
+        self._sorted_path_ids = [path_ids[i] for i in self._sorted_paths]
+
+        # rows by value id
+        self._rows_by_type = self._postings(type_column, len(self.types))
+        self._rows_by_name = self._postings(name_column, len(self.names))
+        self._rows_by_path = self._postings(path_column, len(self.paths))
+        self._rows_by_index = self._postings(index_column, len(self.indices))
+        self._rows_by_project = self._project_postings(path_column)
+
+        # only the line columns are kept, the other columns are answered by the posting lists
+        if numpy is not None:
+            self.line_start_column = numpy.array(line_start_column, dtype=numpy.int_)
+            self.line_end_column = numpy.array(line_end_column, dtype=numpy.int_)
+            self.all_rows = numpy.arange(len(components))
+        else:
+            self.line_start_column = line_start_column
+            self.line_end_column = line_end_column
+            self.all_rows = range(len(components))
+        logging.info('component table: {0} rows, {1} names, {2} paths, {3} indices'.format(
+            len(components), len(self.names), len(self.paths), len(self.indices)))
+
+    @staticmethod
+    def _intern(value, ids, values, key=None):
+        if key is None:
+            key = value
+        value_id = ids.get(key)
+        if value_id is None:
+            value_id = len(values)
+            ids[key] = value_id
+            values.append(value)
+        return value_id
+
+    @classmethod
+    def _rows(cls, rows):
+        # the posting lists are shared by every query, so the numpy ones are read only
+        if numpy is None:
+            return rows
+        rows = numpy.array(rows, dtype=numpy.int_)
+        rows.flags.writeable = False
+        return rows
+
+    @classmethod
+    def _postings(cls, column, size):
+        postings = [[] for i in range(size)]
+        for row, value_id in enumerate(column):
+            if value_id != cls.NO_ID:
+                postings[value_id].append(row)
+        return [cls._rows(i) for i in postings]
+
+    def _project_postings(self, path_column):
+        # a component is part of the project with the nearest root config above it
+        project_dirs = []
+        for t, rows in zip(self.types, self._rows_by_type):
+            if issubclass(t, Project):
+                for row in rows:
+                    project = self.components[row]
+                    project_dirs.append((os.path.dirname(project.path), project))
+        # the deepest dirs first
+        project_dirs.sort(key=lambda x: len(x[0]), reverse=True)
+
+        project_by_path_id = []
+        for path in self.paths:
+            path_project = None
+            for project_dir, project in project_dirs:
+                if path == project_dir or path.startswith(os.path.join(project_dir, '')):
+                    path_project = project
+                    break
+            project_by_path_id.append(path_project)
+
+        rows_by_project = {}
+        for row, path_id in enumerate(path_column):
+            project = project_by_path_id[path_id]
+            if project is not None:
+                rows_by_project.setdefault(project, []).append(row)
+        return {k: self._rows(v) for k, v in rows_by_project.items()}
+
+    def __len__(self):
+        return self.size
+
+    def materialize(self, rows) -> list:
+        # the components of the selected rows
+        components = self.components
+        return [components[i] for i in rows]
+
+    def filter_rows(self, rows, filter_func):
+        # the rows of the components the filter function keeps
+        components = self.components
+        return self._rows([i for i in rows if filter_func(components[i])])
+
+    def _in_scope(self, rows, posting_lists):
+        # the rows of the posting lists that are also in the scope rows, all of them are sorted
+        posting_lists = [i for i in posting_lists if len(i)]
+        if not posting_lists:
+            return self._rows([])
+        if numpy is not None:
+            postings = posting_lists[0]
+            if len(posting_lists) > 1:
+                postings = numpy.unique(numpy.concatenate(posting_lists))
+            if rows is self.all_rows:
+                return postings
+            return numpy.intersect1d(rows, postings, assume_unique=True)
+
+        if len(posting_lists) == 1:
+            postings = posting_lists[0]
+        else:
+            postings = sorted(set().union(*posting_lists))
+        if rows is self.all_rows:
+            return postings
+        rows = set(rows)
+        return [i for i in postings if i in rows]
+
+    def _index_ids(self, predicate):
+        return [i for i, index in enumerate(self.indices) if predicate(index)]
+
+    def by_name(self, rows, name):
+        name_id = self._name_ids.get(name)
+        return self._in_scope(rows, [] if name_id is None else [self._rows_by_name[name_id]])
+
+    def by_path(self, rows, path):
+        return self.by_paths(rows, [path])
+
+    def by_paths(self, rows, paths, dir_paths=()):
+        # the components at one of the paths or anywhere under one of the dirs
+        path_ids = [self._path_ids[i] for i in paths if i in self._path_ids]
+        for dir_path in dir_paths:
+            path_ids.extend(self._path_ids_under(dir_path))
+        return self._in_scope(rows, [self._rows_by_path[i] for i in path_ids])
+
+    def _path_ids_under(self, dir_path):
+        prefix = os.path.join(dir_path, '')
+        # every path starting with the prefix sorts before the prefix with its last char incremented
+        end_prefix = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        start = bisect.bisect_left(self._sorted_paths, prefix)
+        end = bisect.bisect_left(self._sorted_paths, end_prefix, start)
+        return self._sorted_path_ids[start:end]
+
+    def by_index_type(self, rows, index_type):
+        index_ids = self._index_ids(lambda x: x.index_type == index_type)
+        return self._in_scope(rows, [self._rows_by_index[i] for i in index_ids])
+
+    def by_match(self, rows, query):
+        # same as filtering on component.match(query): the name, or the name or type of the index
+        index_ids = self._index_ids(lambda x: x.match(query))
+        posting_lists = [self._rows_by_index[i] for i in index_ids]
+        name_id = self._name_ids.get(query)
+        if name_id is not None:
+            posting_lists.append(self._rows_by_name[name_id])
+        return self._in_scope(rows, posting_lists)
+
+    def by_type(self, rows, component_type):
+        type_ids = [i for i, t in enumerate(self.types) if issubclass(t, component_type)]
+        return self._in_scope(rows, [self._rows_by_type[i] for i in type_ids])
+
+    def by_project(self, rows, projects: list):
+        return self._in_scope(rows, [self._rows_by_project[p] for p in projects if p in self._rows_by_project])
+
+    def intervals(self, path) -> ItemIntervals:
+        intervals = self._intervals.get(path)
+        if intervals is None:
+            items = [c for c in self.materialize(self.by_path(self.all_rows, path)) if isinstance(c, IndexedItem)]
+            intervals = ItemIntervals(items)
+            self._intervals[path] = intervals
+        return intervals
+
+    @property
+    def projects(self) -> list:
+        return list(self._rows_by_project)
+
+    def overlapping(self, rows, line_start, line_end):
+        # items sharing a line with the lines from line_start up to and including line_end
+        starts = self.line_start_column
+        ends = self.line_end_column
+        if numpy is not None:
+            rows = numpy.asarray(rows, dtype=numpy.int_)
+            mask = (starts[rows] != self.NO_ID) & (starts[rows] <= line_end) & (ends[rows] >= line_start)
+            return rows[mask]
+        return [i for i in rows if starts[i] != self.NO_ID and starts[i] <= line_end and ends[i] >= line_start]
@@ -0,0 +1,137 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+
+
+class IndexCache():
+    # persistent cache of the extracted items per indexed file
+    # a cached file is valid as long as its mtime, size and the item index configs did not change
+
+    SCHEMA_VERSION = 1
+
+    _SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS files (
+        path TEXT NOT NULL,
+        name TEXT NOT NULL,
+        index_name TEXT NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        size INTEGER NOT NULL,
+        config_hash TEXT NOT NULL,
+        items TEXT NOT NULL,
+        PRIMARY KEY (path, index_name)
+    )
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._connection = None
+        try:
+            self._connection = self._connect(path)
+        except sqlite3.OperationalError as e:
+            # locked or busy, the cache file can be in use by another process so it is kept
+            logging.error('Could not open the index cache at: {0}\n{1}\nindexing without the cache'.format(path, e))
+        except sqlite3.DatabaseError as e:
+            logging.error('Could not open the index cache at: {0}\n{1}\nremoving the cache file'.format(path, e))
+            try:
+                os.remove(path)
+                self._connection = self._connect(path)
+            except (OSError, sqlite3.DatabaseError) as e:
+                logging.error('Index cache disabled: {0}'.format(e))
+                self._connection = None
+
+    @classmethod
+    def _connect(cls, path):
+        connection = sqlite3.connect(path)
+        try:
+            version = connection.execute('PRAGMA user_version').fetchone()[0]
+            if version != cls.SCHEMA_VERSION:
+                connection.execute('DROP TABLE IF EXISTS files')
+                connection.execute('PRAGMA user_version = {0}'.format(cls.SCHEMA_VERSION))
+            connection.execute(cls._SCHEMA)
+            connection.commit()
+        except sqlite3.DatabaseError:
+            connection.close()
+            raise
+        return connection
+
+    def _disable(self, error):
+        # the cache only speeds up indexing, when it fails the rest of the run goes without it
+        logging.error('Index cache at: {0} failed, indexing without the cache\n{1}'.format(self.path, error))
+        try:
+            self._connection.close()
+        except sqlite3.DatabaseError:
+            pass
+        self._connection = None
+
+    @property
+    def enabled(self):
+        return self._connection is not None
+
+    @staticmethod
+    def config_hash(indices) -> str:
+        # hash of the (merged) configs of the indices used to extract the items
+        # the order matters, the item records refer to the indices by position
+        configs = [(i.name, i.index_type, i.config) for i in indices]
+        dump = json.dumps(configs, sort_keys=True, default=str)
+        return hashlib.sha1(dump.encode('utf8')).hexdigest()
+
+    def get(self, indexed_file, stat_key, config_hash):
+        # returns the cached item records of the file, or None if the file or the configs changed
+        if not self.enabled or stat_key is None:
+            return None
+        try:
+            row = self._connection.execute(
+                'SELECT mtime_ns, size, config_hash, items FROM files WHERE path = ? AND index_name = ?',
+                (indexed_file.path, indexed_file.index.name)).fetchone()
+        except sqlite3.DatabaseError as e:
+            self._disable(e)
+            return None
+
+        if row is None or (row[0], row[1]) != tuple(stat_key) or row[2] != config_hash:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[3])
+
+    def put(self, indexed_file, stat_key, config_hash, records):
+        if not self.enabled or stat_key is None:
+            return
+        try:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO files (path, name, index_name, mtime_ns, size, config_hash, items) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (indexed_file.path, indexed_file.name, indexed_file.index.name, stat_key[0], stat_key[1], config_hash,
+                 json.dumps(records)))
+        except sqlite3.DatabaseError as e:
+            self._disable(e)
+
+    def prune(self, root_dir, paths):
+        # remove the files under the root dir that are not indexed anymore
+        if not self.enabled:
+            return
+        paths = set(paths)
+        prefix = os.path.join(root_dir, '')
+        try:
+            cached_paths = [i[0] for i in self._connection.execute(
+                'SELECT path FROM files WHERE substr(path, 1, ?) = ?', (len(prefix), prefix))]
+            stale_paths = [(i,) for i in cached_paths if i not in paths]
+            self._connection.executemany('DELETE FROM files WHERE path = ?', stale_paths)
+        except sqlite3.DatabaseError as e:
+            self._disable(e)
+
+    def commit(self):
+        if not self.enabled:
+            return
+        try:
+            self._connection.commit()
+        except sqlite3.DatabaseError as e:
+            self._disable(e)
+
+    def close(self):
+        if self.enabled:
+            self._connection.close()
+            self._connection = None
@@ -23,7 +23,9 @@ class FileEditor(EditorBase):
 
     def split(self):
 
-        items_positions = list(sorted([(i.line_start, i.line_end) for i in self.items], key=lambda x: x[0]))
+        # the interval tree keeps the items of the file sorted by line start
+        items = self.indexer.item_intervals(self.file.path).items
+        items_positions = [(i.line_start, i.line_end) for i in items]
         if len(items_positions) ==0:
             return None
 
@@ -40,7 +42,7 @@ class FileEditor(EditorBase):
 
         items_in_between = [IndexedItem('_', self.file, start, end, None) for start, end in items_in_between]
 
-        all_items = [*self.items, *items_in_between]
+        all_items = [*items, *items_in_between]
 
         return list(sorted(all_items, key=lambda x: x.line_start))
 
@@ -1,20 +1,30 @@
+import collections
 import inspect
 import logging
 import os
 import re
 import pathlib
+import string
+from concurrent.futures import ProcessPoolExecutor
 
 from ..models.indexer import Index, Indexed, Indices, Printable
 
 from ..models.components import IndexedFile, SourceFile, IndexedItem, Source, SourceComponentContainer, Project, \
-    IndexedSourceComponent
-from ..utils.utils import find_dirs, merge, LOG_CONSTANTS
+    IndexedSourceComponent, Folder
+from ..utils.utils import find_dirs, merge, LOG_CONSTANTS, file_stat_key
+from ..utils.workspace import IgnoreRules, WorkspaceSnapshot
 from ..utils import framework_manager
+from .index_cache import IndexCache
+from ..models.table import ComponentTable, ItemIntervals
+from .trigram_index import TrigramIndex, required_literals
 
 
 class SourceIndexerBase:
     CALLER_DIR = None
 
+    # snapshot of the workspace, shared by the index config and the file scans
+    _workspace = None
+
     @classmethod
     def prepare(cls, init_config):
 
@@ -26,6 +36,7 @@ class SourceIndexerBase:
         logging.info('The following dir will be used to search the root config from: >> {0} <<'.format(caller_dir))
 
         SourceIndexerBase.CALLER_DIR = caller_dir
+        SourceIndexerBase._workspace = None
         return cls
 
     _config = {
@@ -34,7 +45,17 @@ class SourceIndexerBase:
             'identifier': '.config$'
         },
         'root_config_name': 'root.config',
-        'root_config_folder': '{home}/.source_framework'
+        'root_config_folder': '{home}/.source_framework',
+        # persistent cache of the extracted items, stored in the root config folder
+        'index_cache_name': 'index.cache',
+        # dirs and files skipped when walking the workspace
+        # the ignore section in the root config is merged into this one
+        'ignore': {
+            'exclude': [],
+            'exclude_dirs': ['^\\.git$', '^\\.hg$', '^\\.svn$', '^node_modules$', '^__pycache__$',
+                             '^\\.?venv$', '^\\.tox$', '^\\.nox$', '^build$', '^dist$', '\\.egg-info$'],
+            'gitignore': False
+        }
     }
 
     @classmethod
@@ -83,8 +104,23 @@ class SourceIndexerBase:
         return SourceFile(root_config_name, root_config_path)
 
     @classmethod
-    def _get_paths_by_identifiers(cls, identifiers: list):
-        root_dir = cls._get_root_dir()
+    def _get_ignore_rules(cls) -> IgnoreRules:
+        root_config = merge(cls._get_or_create_base_config().yaml, cls._get_root_config().yaml)
+        workspace_ignore_config = merge(cls._config['ignore'], root_config.get('ignore') or {})
+        return IgnoreRules.from_config(workspace_ignore_config)
+
+    @classmethod
+    def _get_workspace(cls, rescan=False) -> WorkspaceSnapshot:
+        if SourceIndexerBase._workspace is None or rescan:
+            root_dir = cls._get_root_dir()
+            logging.info('Walking the workspace at: {0}'.format(root_dir))
+            SourceIndexerBase._workspace = WorkspaceSnapshot.scan(root_dir, cls._get_ignore_rules())
+        return SourceIndexerBase._workspace
+
+    @classmethod
+    def _get_paths_by_identifiers(cls, identifiers: list, ignore_config: dict = None):
+        workspace = cls._get_workspace()
+        ignore = IgnoreRules.from_config(ignore_config)
 
         logging.info('searching for matching paths using the following identifiers: {0}'.format(identifiers))
 
@@ -93,12 +129,8 @@ class SourceIndexerBase:
             print('YOU WILL LOSE YOUR INDEX')
             print('YOU PROBABLY NEED TO WRITE A NEW METHOD IF YOU NEED TO INDEX MULTIPLE INDICES WITH SAME IDENTIFIER')
 
-        matches_by_identifier = {k: [] for k in identifiers}
-        for path, dirs, files in os.walk(root_dir):
-            for identifier in identifiers:
-                matches = [os.path.join(path, i) for i in dirs + files if str(i).endswith(identifier)]
-                matches_by_identifier[identifier].extend(matches)
-        logging.info('found {0} matches.'.format(len(matches)))
+        matches_by_identifier = workspace.find_paths_by_identifiers(identifiers, ignore)
+        logging.info('found {0} matches.'.format(sum(map(len, matches_by_identifier.values()))))
         return matches_by_identifier
 
     @classmethod
@@ -207,10 +239,11 @@ class SourceIndexerBase:
 
             # TODO
             merged_config_dict = merge(parent_config.config, index.config)
-            merged_index_config = SourceFile(name=index.name, path=index.config_file.path,
-                                             source=Source.from_yaml(merged_config_dict))
 
-            index = Index(name=index.name, index_type=index.index_type, config_file=merged_index_config)
+            index = Index(name=index.name, index_type=index.index_type, config_file=index.config_file,
+                          config=merged_config_dict)
+            if index.index_type == 'item':
+                index.matcher = ItemMatcher.from_index(index)
             merged_indices.append(index)
 
         logging.info('\n--------------\nGET INDICES COMPLETE\n--------------')
@@ -322,7 +355,8 @@ class SourceIndexerBase:
         return Source.from_yaml(base_config)
 class FileIndexer(SourceIndexerBase):
     @classmethod
-    def _index_files(cls, indices: Indices):
+    def _index_files(cls, indices: Indices, known_files: dict = None):
+        # known files ((path, index name) -> indexed file) are reused instead of loading the file again
         identifiers_with_indices = {}
         assert all(list(map(lambda x: x.index_type == 'file', indices)))
 
@@ -346,7 +380,18 @@ class FileIndexer(SourceIndexerBase):
             identifiers_with_indices[i.identifier] = i
         assert isinstance(indices, Indices)
         # indices = []
-        indexed_paths = cls._get_paths_by_identifiers(list(identifiers_with_indices.keys()))
+
+        # the excludes every file index has in common (normally the ones from root.file.index)
+        # prune the walk, the remaining excludes are checked per index
+        excludes_by_identifier = {k: i.config.get('exclude') or [] for k, i in identifiers_with_indices.items()}
+        common_excludes = [e for e in next(iter(excludes_by_identifier.values()), [])
+                           if all(e in excludes for excludes in excludes_by_identifier.values())]
+        index_ignores = {k: IgnoreRules(exclude=[e for e in excludes if e not in common_excludes])
+                         for k, excludes in excludes_by_identifier.items()}
+
+        indexed_paths = cls._get_paths_by_identifiers(list(identifiers_with_indices.keys()),
+                                                      ignore_config={'exclude': common_excludes})
+        root_dir = cls._get_workspace().root_dir
 
         files = []
         for identifier, paths in indexed_paths.items():
@@ -356,6 +401,13 @@ class FileIndexer(SourceIndexerBase):
             for p in paths:
                 index = identifiers_with_indices[identifier]
                 assert isinstance(index, Index)
+                if index_ignores[identifier].ignores_path(p, root_dir):
+                    logging.info('excluded by index {0}: {1}'.format(index.name, p))
+                    continue
+                known_file = known_files.get((os.path.realpath(p), index.name)) if known_files else None
+                if known_file is not None and known_file.index is index:
+                    files.append(known_file)
+                    continue
                 indexed_index_file = IndexedFile.from_path(path=p, index=index)
                 files.append(indexed_index_file)
 
@@ -369,19 +421,22 @@ class FileIndexer(SourceIndexerBase):
             else:
                 return False
 
-        return self.filter(filter_func)
+        # _query is defined on the source indexer, the table answers it without calling filter_func per component
+        return self._query(filter_func, lambda table, rows: table.by_index_type(rows, 'file'), ('index_type', 'file'))
 
     @classmethod
-    def index_all(cls, indexer):
+    def index_all(cls, indexer, known_files: dict = None):
         file_indices = indexer.indices.file.ok
         file_indices.log()
 
-        all_indexed_files = indexer._index_files(file_indices)
+        all_indexed_files = indexer._index_files(file_indices, known_files)
         all_indexed_files.log()
         return all_indexed_files
 
 
 class ItemIndexer(FileIndexer):
+    # combined matchers by the item matchers they combine
+    _combined_matchers = {}
 
 
 
@@ -421,6 +476,54 @@ class ItemIndexer(FileIndexer):
         identifier = identifier_string.format(**format_arg_dict)
         return identifier
 
+    @classmethod
+    def _item_definition(cls, index: Index):
+        # returns the start regex and the end regex template of an item index
+        # the named tags of the start match are formatted into the end regex template when extracting
+        if index.index_type != 'item':
+            logging.error('Trying to extract items from non item index: {0}'.format((index.name, index.index_type)))
+        assert index.index_type == 'item'
+        config = index.config
+        parse_tags = config['parse_tags']
+        identifier_start_config = index.identifier['start']
+
+        # TODO does this work???
+        if 'end' in config['identifier']:
+            identifier_end_config = index.identifier['end']
+        else:
+            logging.info('NO END TAG PROVIDED')
+            logging.info('getting default end identifier tag from root.item.index')
+            if 'end_default' not in parse_tags:
+                error_message = 'Could not find default end identifier tag'
+                logging.error(error_message)
+                raise Exception(error_message)
+            identifier_end_config = parse_tags['end_default']
+
+        format_arg_values = merge(config, parse_tags)
+
+        start_identifier = cls.parse_identifier_arguments(format_arg_values, identifier_start_config)
+        # NOT SURE IF THE SAME END IDENTIFIER AS START_IDENTIFIER WORKS
+        end_identifier = cls.parse_identifier_arguments(format_arg_values, identifier_end_config, False)
+        return start_identifier, end_identifier
+
+    @classmethod
+    def _get_matcher(cls, index: Index):
+        # the matcher is compiled once per index, normally when the indices are retrieved
+        if index.matcher is None:
+            index.matcher = ItemMatcher.from_index(index)
+        return index.matcher
+
+    @classmethod
+    def _get_combined_matcher(cls, indices: Indices):
+        matchers = tuple(cls._get_matcher(i) for i in indices)
+        combined_matcher = ItemIndexer._combined_matchers.get(matchers)
+        if combined_matcher is None:
+            if len(ItemIndexer._combined_matchers) > 16:
+                ItemIndexer._combined_matchers.clear()
+            combined_matcher = CombinedItemMatcher(matchers)
+            ItemIndexer._combined_matchers[matchers] = combined_matcher
+        return combined_matcher
+
     @classmethod
     def _extract_items(cls, indexed_file: IndexedFile, indices: Indices):
         logging.info('Extracting items from:')
@@ -428,103 +531,191 @@ class ItemIndexer(FileIndexer):
         indexed_file.log()
         all_extracted_items = []
         # TODO VALIDATE ?
-        for i in indices:
-            if i.index_type != 'item':
-                logging.error('Trying to extract items from non item index: {0}'.format((i.name, i.index_type)))
-            assert i.index_type == 'item'
-            config = i.config
-            parse_tags = config['parse_tags']
-            identifier_start_config = i.identifier['start']
-
-            # TODO does this work???
-            if 'end' in config['identifier']:
-                identifier_end_config = i.identifier['end']
-            else:
-                logging.info('NO END TAG PROVIDED')
-                logging.info('getting default end identifier tag from root.item.index')
-                if 'end_default' not in parse_tags:
-                    error_message = 'Could not find default end identifier tag'
-                    logging.error(error_message)
-                    raise Exception(error_message)
-                identifier_end_config = parse_tags['end_default']
-
-            format_arg_values = merge(config, parse_tags)
-
-            start_identifier = cls.parse_identifier_arguments(format_arg_values, identifier_start_config)
-            # NOT SURE IF THE SAME END IDENTIFIER AS START_IDENTIFIER WORKS
-            end_identifier = cls.parse_identifier_arguments(format_arg_values, identifier_end_config, False)
-
-            extracted_items = cls._extract_items_from_source(start_identifier, end_identifier, indexed_file, i)
+        indices = list(indices)
+        # the file is scanned once for the items of all indices
+        matched_items_by_index = cls._get_combined_matcher(indices).match_items(indexed_file.source)
+        for i, matched_items in zip(indices, matched_items_by_index):
+            extracted_items = [IndexedItem(name, indexed_file, line_start, line_end, i, properties=match_props)
+                               for name, line_start, line_end, match_props in matched_items]
             all_extracted_items.extend(extracted_items)
         logging.info('found {0} items'.format(len(all_extracted_items)))
         logging.info('\n')
         return all_extracted_items
 
-    @staticmethod
-    def _extract_items_from_source(start_match_regex, end_match_regex, indexed_file: IndexedFile, item_index: Index):
-        source = indexed_file.source
 
-        def get_line_number(the_match):
-            return source.count("\n", 0, the_match.start()) + 1
+class ItemMatcher():
+    # the compiled identifiers of an item index
+    # the end regexes are formatted with the named tags of the start match, so they are cached by those tags
 
-        # loop over start matches and get the corresponding end match
-        # then create item
-        items = []
+    MAX_END_REGEXES = 1024
 
-        start_matches = re.finditer(start_match_regex, source)
-
-        for start_match in start_matches:
-            line_start = get_line_number(start_match)
-            match_props = start_match.groupdict()
-            # print(end_match_regex)
+    def __init__(self, start_identifier: str, end_identifier: str):
+        self.start_identifier = start_identifier
+        self.end_identifier = end_identifier
+        self.start_regex = re.compile(start_identifier)
+        self.end_tags = sorted(set(i[1] for i in string.Formatter().parse(end_identifier) if i[1] is not None))
+        self._end_regexes = {}
 
+    @classmethod
+    def from_index(cls, index: Index):
+        start_identifier, end_identifier = ItemIndexer._item_definition(index)
+        return cls(start_identifier, end_identifier)
+
+    def end_regex(self, match_props: dict):
+        key = tuple(match_props.get(i) for i in self.end_tags)
+        end_regex = self._end_regexes.get(key)
+        if end_regex is None:
             try:
-                end_regex = end_match_regex.format(**match_props)
-            except Exception:
+                end_regex = re.compile(self.end_identifier.format(**match_props))
+            except (KeyError, IndexError, ValueError):
                 error_message = 'could not format the end tag using the named tags in the start identifier\n' \
                                 'Tried to format the string: {0} using the available arguments: {1}\n'.format(
-                    end_match_regex, match_props) \
+                    self.end_identifier, match_props) \
                                 + 'If you dont want to use a end identifier leave the end attribute empty in ' \
                                   'the identifier options in your index config \nthe standard end identifier in the ' \
                                   'root item index config will be used.. normally matching 1 or more whitespaces ( {ws}+ )'
 
                 logging.error(error_message)
                 raise Exception(error_message)
-            # check for end of item matches
-            assert isinstance(source, Source)
 
-            source_from_start_match = source[line_start:]
+            if len(self._end_regexes) >= self.MAX_END_REGEXES:
+                self._end_regexes.clear()
+            self._end_regexes[key] = end_regex
+        return end_regex
 
-            line_end = None
-            for index, line in enumerate(source_from_start_match):
-                if re.match(end_regex, line):
-                    line_end = line_start + index
-                    break
-            if line_end is None:
-                # No end tag found for dependency section
-                error_message = 'Could not find end of item with match props: {0}\nstart regex: {1}\nend regex: {2}'.format(
-                    match_props, start_match_regex, end_regex)
-                logging.error(error_message)
+    def __getstate__(self):
+        # the end regexes are not send to the worker processes
+        state = dict(self.__dict__)
+        state['_end_regexes'] = {}
+        return state
 
-                raise Exception(error_message)
+    def match_items(self, source: Source):
+        # returns the name, line start, line end and named tags of every item in the source
+        items = []
+        assert isinstance(source, Source)
+
+        # loop over start matches and get the corresponding end match
+        # then create item
+        # the regex runs on the buffer of the source, within the range of the source
+        start, end = source.span
+        for start_match in self.start_regex.finditer(source.buffer, start, end):
+            items.append(self._match_item(start_match, source))
+        return items
 
-            # TODO cleanup
-            if 'name' not in match_props:
-                # error_message = 'a name must be defined for an item index\n' \
-                #                 'include the name tag {name} somewhere in the start identifier string for matching' \
-                #                 'available variables {0}'.format(match_props) + \
-                #                 'NOTE: the tags in the start identifier are available in the end identifier'
-                # logging.error(error_message)
-                match_props['name'] = '_'
-                # raise AttributeError(error_message)
+    def _match_item(self, start_match, source: Source):
+        line_start = source.line_number(start_match.start())
+        match_props = start_match.groupdict()
+
+        # check for end of item matches
+        end_regex = self.end_regex(match_props)
+
+        line_end = None
+        for index, line in enumerate(source.iter_lines(line_start)):
+            if end_regex.match(line):
+                line_end = line_start + index
+                break
+        if line_end is None:
+            # No end tag found for dependency section
+            error_message = 'Could not find end of item with match props: {0}\nstart regex: {1}\nend regex: {2}'.format(
+                match_props, self.start_identifier, end_regex.pattern)
+            logging.error(error_message)
 
-            name = match_props['name']
-            del (match_props['name'])
+            raise Exception(error_message)
 
-            item = IndexedItem(name, indexed_file, line_start, line_end, item_index, properties=match_props)
-            items.append(item)
+        # TODO cleanup
+        if 'name' not in match_props:
+            # error_message = 'a name must be defined for an item index\n' \
+            #                 'include the name tag {name} somewhere in the start identifier string for matching' \
+            #                 'available variables {0}'.format(match_props) + \
+            #                 'NOTE: the tags in the start identifier are available in the end identifier'
+            # logging.error(error_message)
+            match_props['name'] = '_'
+            # raise AttributeError(error_message)
 
-        return items
+        name = match_props['name']
+        del (match_props['name'])
+
+        return name, line_start, line_end, match_props
+
+
+class CombinedItemMatcher():
+    # scans a source once for the items of multiple item indices
+    # the start regexes are merged into one alternation that finds every position where any index matches,
+    # at those positions the matching indices are found with anchored matches.
+    # every index gets exactly the matches it would get when scanning the source on its own
+
+    _GROUP_REGEX = re.compile(r'\(\?P(<|=)([A-Za-z_][A-Za-z0-9_]*)')
+    # numbered backreferences and conditional groups can not be merged
+    _UNMERGEABLE_REGEX = re.compile(r'\\[1-9]|\(\?\(')
+
+    def __init__(self, matchers):
+        self.matchers = list(matchers)
+        self.combined_regex = self._combine([m.start_identifier for m in self.matchers])
+
+    @classmethod
+    def _combine(cls, start_identifiers):
+        if len(start_identifiers) < 2:
+            return None
+
+        alternatives = []
+        for position, identifier in enumerate(start_identifiers):
+            if cls._UNMERGEABLE_REGEX.search(identifier):
+                logging.info('can not combine start identifier, scanning per index: {0}'.format(identifier))
+                return None
+            # prefix the named groups, the same names are used by every index
+            renamed = cls._GROUP_REGEX.sub(lambda m: '(?P{0}_{1}_{2}'.format(m.group(1), position, m.group(2)),
+                                           identifier)
+            alternatives.append('(?:{0})'.format(renamed))
+        try:
+            return re.compile('|'.join(alternatives))
+        except re.error as e:
+            logging.info('can not combine start identifiers, scanning per index: {0}'.format(e))
+            return None
+
+    def match_items(self, source: Source):
+        # returns the matched items per matcher
+        if self.combined_regex is None:
+            return [m.match_items(source) for m in self.matchers]
+
+        assert isinstance(source, Source)
+        matched_items = [[] for _ in self.matchers]
+        # where the next match of every index may start, as with finditer per index
+        buffer = source.buffer
+        position, end = source.span
+        next_positions = [position] * len(self.matchers)
+        search = self.combined_regex.search
+        while True:
+            hit = search(buffer, position, end)
+            if hit is None:
+                break
+            hit_position = hit.start()
+            for i, matcher in enumerate(self.matchers):
+                if next_positions[i] > hit_position:
+                    continue
+                start_match = matcher.start_regex.match(buffer, hit_position, end)
+                if start_match is None:
+                    continue
+                matched_items[i].append(matcher._match_item(start_match, source))
+                next_positions[i] = max(start_match.end(), hit_position + 1)
+            position = hit_position + 1
+            # search clamps the position to the end, an empty match at the end would be found again
+            if position > end:
+                break
+        return matched_items
+
+
+def _extract_item_records(paths, combined_matcher):
+    # runs in the worker processes of the parallel item extraction
+    # returns the compact item records of every file, see SourceIndexer._item_records
+    all_records = []
+    for path in paths:
+        source = SourceFile(os.path.basename(path), path).source
+        records = []
+        for position, matched_items in enumerate(combined_matcher.match_items(source)):
+            for name, line_start, line_end, match_props in matched_items:
+                records.append((position, name, line_start, line_end, match_props))
+        all_records.append(records)
+    return all_records
 
 
 class ProjectIndexer(SourceIndexerBase):
@@ -537,15 +728,16 @@ class ProjectIndexer(SourceIndexerBase):
         base_config = Project.from_path(base_config_file.path)
         project_config = Project(cls._get_root_config())
 
-        project_paths = []
         unique_projects = []
         all_projects = [*project_config.with_dependencies(), *base_config.with_dependencies()]
 
+        # projects are equal when their config paths are
+        seen_projects = set()
         while len(all_projects) != 0:
             p = all_projects.pop()
-            if p.path in project_paths:
+            if p in seen_projects:
                 continue
-            project_paths.append(p.path)
+            seen_projects.add(p)
             unique_projects.append(p)
         return Indexed(unique_projects)
 
@@ -559,25 +751,68 @@ class SourceIndexer(ItemIndexer, ProjectIndexer, Printable, SourceComponentConta
     TIMES_INDEXED = 0
 
     _all_indexed = None
-
-    def __init__(self, indices: Indices = None, scoped: Indexed = None, index_all=True):
+    # (path, index name) -> (stat key, indexed file, extracted items) of the last indexing, used by refresh
+    _indexed_files = {}
+    # hash of the index configs used for the last indexing
+    _indexed_config_hash = None
+    # columns of all indexed components, built on the first query
+    _table = None
+    # trigrams of the indexed files, built by the first search (or by init with search_index) and kept up to date
+    _trigram_index = None
+
+    # selected rows of the cached query plans, see _plan_key, bounded to the least recently used
+    QUERY_CACHE_SIZE = 256
+    _query_cache = collections.OrderedDict()
+    # changes every time the indexed components change
+    _generation = 0
+
+    # (rows of the table, scoped components list, table) when the scope is a selection of the table
+    _rows = None
+    # (rows, table) when the scope is a selection of the table whose components list was not built yet
+    _selection = None
+    # filters and maps not applied to the scope yet, see _run_plan
+    _plan = ()
+    # derived indexers share the scope list of the indexer they came from, it is copied before it is changed
+    _owns_scope = True
+    # (scoped components list, item interval trees by path) for scopes that are not the whole table
+    _intervals = (None, None)
+
+    def __init__(self, indices: Indices = None, scoped: Indexed = None, index_all=True, use_cache=True, workers=None,
+                 search_index=False):
+        self.use_cache = use_cache
+        # amount of processes used to extract the items, None or 1 extracts in this process
+        self.workers = workers
         self.indices = indices or self._get_indices()
         if index_all:
             SourceIndexer._all_indexed = self._index_all()
+            if search_index:
+                self._get_trigram_index()
 
-        self.scoped = scoped or SourceIndexer._all_indexed
+        # an empty scope stays empty
+        self.scoped = scoped if scoped is not None else SourceIndexer._all_indexed
         self.current = 0
 
 
 
     def __getattr__(self, name):
-        return self.filter(lambda x: x.match(name))
+        return self._query(lambda x: x.match(name), lambda table, rows: table.by_match(rows, name), ('match', name))
 
     def __getitem__(self, item):
         if isinstance(item, slice):
             self.scoped = Indexed(self.scoped[item.start, item.stop])
             return self
 
+        if isinstance(item, str):
+            # look up the components with the name, the scoped components check it is unique
+            return self._query(lambda x: x.name == item, lambda table, rows: table.by_name(rows, item),
+                               ('name', item)).scoped[item]
+
+        if isinstance(item, int):
+            self._resolve()
+            if self._selection is not None:
+                rows, table = self._selection
+                return table.components[rows[item]]
+
         logging.debug('get item {0} from source indexer, passing it to the scoped indexed components'.format(item))
         return self.scoped[item]
 
@@ -585,7 +820,16 @@ class SourceIndexer(ItemIndexer, ProjectIndexer, Printable, SourceComponentConta
 
         if isinstance(other, SourceFile):
             extracted_items = self._extract_items(other, indices=self.indices.item)
-            self.components.extend(extracted_items)
+            components = self.components
+            if self._scoped is SourceIndexer._all_indexed and self._owns_scope:
+                # added to all indexed components
+                components.extend(extracted_items)
+            else:
+                # the scope can be shared with other indexers or be a list of the caller, see from_components
+                self.scoped = Indexed._from_components([*components, *extracted_items])
+            self._next_generation()
+            if SourceIndexer._trigram_index is not None:
+                SourceIndexer._trigram_index.add(other, file_stat_key(other.path))
 
         return self
 
@@ -596,17 +840,207 @@ class SourceIndexer(ItemIndexer, ProjectIndexer, Printable, SourceComponentConta
 
     @property
     def copy(self):
-        return SourceIndexer(indices=Indices(self.indices.scoped), scoped=Indexed(self.scoped), index_all=False)
+        return self._derive()
 
+    @property
+    def scoped(self):
+        # the recorded filters and maps are applied when the components are needed
+        self._resolve()
+        if self._selection is not None:
+            self._materialize()
+        return self._scoped
+
+    @scoped.setter
+    def scoped(self, value):
+        self._scoped = value
+        self._plan = ()
+        self._owns_scope = True
+        self._selection = None
+
+    def _resolve(self):
+        # runs the plan, the scope is then either a selection of the table or a list (that can be shared)
+        if self._plan:
+            self._run_plan()
+
+    def _select(self, rows):
+        # the scope becomes the rows of the table, no components list is built until one is needed
+        self._plan = ()
+        self._owns_scope = True
+        self._selection = (rows, SourceIndexer._table)
+
+    def _materialize(self):
+        # the list of the selected components, it belongs to this indexer only so it can be changed in place
+        rows, table = self._selection
+        components = table.materialize(rows)
+        self._scoped = Indexed._from_components(components)
+        self._rows = (rows, components, table)
+        self._selection = None
+        self._owns_scope = True
+
+    def filter(self, filter_func, mutable=False):
+        return self._add_step(('filter', filter_func, None, None), mutable)
+
+    def map(self, map_func, mutable=False):
+        return self._add_step(('map', map_func, None, None), mutable)
+
+    def _query(self, filter_func, table_query, key=None):
+        # a filter the component table can answer, table_query selects the rows from the rows in scope
+        # the key identifies the filter for the query cache, filters without a key are not cached
+        return self._add_step(('filter', filter_func, table_query, key))
+
+    def _add_step(self, step, mutable=False):
+        if mutable:
+            self._plan = (*self._plan, step)
+            return self
+        return self._derive(step)
+
+    def _derive(self, step=None):
+        # a new indexer with the scope and the plan of this one, nothing is copied or filtered yet
+        # the scope list is shared, only the wrapper is new, the mutable maps of Indexed replace its scoped list
+        scoped = self._scoped
+        if isinstance(scoped, Indexed):
+            scoped = Indexed._from_components(scoped.scoped)
+        instance = SourceIndexer(indices=Indices(self.indices.scoped), scoped=scoped, index_all=False,
+                                 use_cache=self.use_cache, workers=self.workers)
+        instance._rows = self._rows
+        instance._selection = self._selection
+        instance._plan = self._plan if step is None else (*self._plan, step)
+        instance._owns_scope = False
+        return instance
 
-    def _index_all(self):
+    @classmethod
+    def _get_table(cls) -> ComponentTable:
+        all_components = cls._all_indexed._components
+        table = cls._table
+        # the components of the last indexing can be extended by adding files
+        if table is None or table.components is not all_components or len(table) != len(all_components):
+            table = ComponentTable(all_components)
+            SourceIndexer._table = table
+        return table
+
+    def _table_rows(self):
+        # the rows of the table in the (unfiltered) scope, or None when the scope is not a selection of the table
+        if self._selection is not None:
+            rows, table = self._selection
+            if table is self._get_table():
+                return rows
+            # the table was built again, the selected rows only hold for the table they came from
+            self._materialize()
+        if SourceIndexer._all_indexed is None or not isinstance(self._scoped, Indexed):
+            return None
+        scoped_components = self._scoped.scoped
+        table = self._get_table()
+        if scoped_components is table.components:
+            return table.all_rows
+        if self._rows is not None:
+            rows, rows_components, rows_table = self._rows
+            # the scope was not changed in place since the rows were selected
+            if rows_components is scoped_components and rows_table is table and len(rows) == len(scoped_components):
+                return rows
+        return None
+
+    def _push_down(self):
+        # filters do not depend on each other, so up to the first map the filters the table can answer run first
+        # returns the rows they selected (None without the table) and the steps that are left, in order
+        plan = self._plan
+        rows = self._table_rows()
+        if rows is None:
+            return None, plan
+
+        first_map = len(plan)
+        for i, step in enumerate(plan):
+            if step[0] == 'map':
+                first_map = i
+                break
+
+        table = SourceIndexer._table
+        steps = []
+        for step in plan[:first_map]:
+            if step[2] is not None:
+                rows = step[2](table, rows)
+            else:
+                steps.append(step)
+        return rows, (*steps, *plan[first_map:])
+
+    def _plan_key(self):
+        # the key of the plan in the query cache, or None when it can not be cached
+        # only plans of keyed filters on all indexed components are cached, their order does not matter
+        if not self._plan or any(step[3] is None for step in self._plan):
+            return None
+        table_rows = self._table_rows()
+        if table_rows is None or table_rows is not SourceIndexer._table.all_rows:
+            return None
+        return SourceIndexer._generation, frozenset(step[3] for step in self._plan)
+
+    def _run_plan(self):
+        plan_key = self._plan_key()
+        if plan_key is not None:
+            cached_rows = SourceIndexer._query_cache.get(plan_key)
+            if cached_rows is not None:
+                SourceIndexer._query_cache.move_to_end(plan_key)
+                # the cached rows are shared by the views, they are never changed in place
+                self._select(cached_rows)
+                return
+
+        rows, steps = self._push_down()
+        if rows is not None:
+            table = SourceIndexer._table
+            # the python filters before the first map keep the selection in rows
+            while steps and steps[0][0] == 'filter':
+                rows = table.filter_rows(rows, steps[0][1])
+                steps = steps[1:]
+            if not steps:
+                self._select(rows)
+                if plan_key is not None:
+                    SourceIndexer._query_cache[plan_key] = rows
+                    if len(SourceIndexer._query_cache) > SourceIndexer.QUERY_CACHE_SIZE:
+                        SourceIndexer._query_cache.popitem(last=False)
+                return
+            components = table.materialize(rows)
+        else:
+            components = self._scoped.scoped
 
-        def check_second_time():
-            SourceIndexer.TIMES_INDEXED += 1
-            if SourceIndexer.TIMES_INDEXED > 1:
-                error_message = 'indexing all the source for the second time, why???'
-                logging.error(error_message)
-                raise Exception(error_message)
+        for kind, func, table_query, key in steps:
+            if kind == 'map':
+                components = [func(c) for c in components]
+            else:
+                components = [c for c in components if func(c)]
+
+        self.scoped = Indexed._from_components(components)
+
+    @classmethod
+    def _next_generation(cls):
+        # the indexed components changed, the cached query results are not valid anymore
+        SourceIndexer._generation += 1
+        SourceIndexer._query_cache.clear()
+
+    def _stream(self):
+        # runs the plan one component at a time, no list of the scope is built
+        if not self._plan and self._selection is None:
+            yield from self._scoped.scoped
+            return
+
+        rows, steps = self._push_down()
+        if rows is not None:
+            table_components = SourceIndexer._table.components
+            components = (table_components[i] for i in rows)
+        else:
+            components = iter(self._scoped.scoped)
+
+        for c in components:
+            for kind, func, table_query, key in steps:
+                if kind == 'map':
+                    c = func(c)
+                elif not func(c):
+                    break
+            else:
+                yield c
+
+    def _index_all(self, known_files: dict = None):
+        # known files are the indexed files of the last indexing that did not change on disk
+        SourceIndexer.TIMES_INDEXED += 1
+        if SourceIndexer.TIMES_INDEXED > 1 and known_files is None:
+            logging.info('indexing all the source again, use refresh() to only index the changed files')
 
         logging.info(LOG_CONSTANTS.REGION.format('INDEXING ALL SOURCE'))
         # self.indices.refresh()
@@ -618,28 +1052,148 @@ class SourceIndexer(ItemIndexer, ProjectIndexer, Printable, SourceComponentConta
             logging.info('------\nskip item indexing.')
             item_indices = None
 
-        all_indexed_files = FileIndexer.index_all(self)
+        all_indexed_files = FileIndexer.index_all(self, known_files)
 
         # TODO
-        all_indexed_items = []
-        if item_indices is not None:
-            for file in all_indexed_files:
-
-                logging.info('Extracting items from: {0}'.format(file))
-
-                indexed_items = self._extract_items(file, item_indices)
-                all_indexed_items.extend(indexed_items)
+        all_indexed_items = self._index_items(all_indexed_files, item_indices)
 
         # index projects
         indexed_projects = ProjectIndexer.index_all(self)
 
         all_indexed = Indexed(all_indexed_items, all_indexed_files, indexed_projects)
+        SourceIndexer._indexed_config_hash = IndexCache.config_hash(self.indices.all)
+        self._next_generation()
+        if SourceIndexer._trigram_index is not None:
+            SourceIndexer._trigram_index.update(all_indexed_files)
         logging.info(LOG_CONSTANTS.REGION.format('INDEXING END'))
         logging.info(
             'indexed {0} source components using {1} indices'.format(len(all_indexed), len(self.indices)))
 
         return all_indexed
 
+    def _index_items(self, indexed_files, item_indices: Indices = None):
+        # extract the items of all indexed files
+        # items of files that did not change since the last indexing are kept,
+        # files that did not change since the last run get their items from the index cache
+        cache = None
+        config_hash = None
+        if item_indices is not None:
+            config_hash = IndexCache.config_hash(item_indices)
+            if self.use_cache:
+                cache = self._get_index_cache()
+
+        indexed_file_states = {}
+        items_by_file = {}
+        files_to_extract = []
+        for file in indexed_files:
+            stat_key = file_stat_key(file.path)
+            file_key = (file.path, file.index.name)
+            known_state = SourceIndexer._indexed_files.get(file_key)
+            indexed_file_states[file_key] = (stat_key, file, None)
+
+            if item_indices is None:
+                items_by_file[file_key] = []
+            elif known_state is not None and stat_key is not None and known_state[0] == stat_key and known_state[1] is file:
+                items_by_file[file_key] = known_state[2]
+            else:
+                records = cache.get(file, stat_key, config_hash) if cache is not None else None
+                if records is not None:
+                    items_by_file[file_key] = self._items_from_records(file, records, item_indices)
+                else:
+                    files_to_extract.append(file)
+
+        if files_to_extract:
+            if self.workers is not None and self.workers > 1 and len(files_to_extract) > 1:
+                extracted_items = self._extract_items_parallel(files_to_extract, item_indices)
+            else:
+                extracted_items = []
+                for f in files_to_extract:
+                    extracted_items.append(self._extract_items(f, item_indices))
+                    if f.unload_after_indexing:
+                        f.unload()
+
+            for file, indexed_items in zip(files_to_extract, extracted_items):
+                file_key = (file.path, file.index.name)
+                items_by_file[file_key] = indexed_items
+                if cache is not None:
+                    stat_key = indexed_file_states[file_key][0]
+                    cache.put(file, stat_key, config_hash, self._item_records(indexed_items, item_indices))
+
+        all_indexed_items = []
+        for file in indexed_files:
+            file_key = (file.path, file.index.name)
+            indexed_items = items_by_file[file_key]
+            indexed_file_states[file_key] = (indexed_file_states[file_key][0], file, indexed_items)
+            all_indexed_items.extend(indexed_items)
+
+        SourceIndexer._indexed_files = indexed_file_states
+
+        if cache is not None:
+            cache.prune(self._get_workspace().root_dir, [f.path for f in indexed_files])
+            cache.commit()
+            logging.info('index cache: {0} files unchanged, {1} files extracted'.format(cache.hits, cache.misses))
+            cache.close()
+        return all_indexed_items
+
+    def _refresh_all(self):
+        # index again, only the added and modified files are read and their items extracted
+        self._get_workspace(rescan=True)
+        indices = self._get_indices()
+
+        known_files = {}
+        if IndexCache.config_hash(indices.all) != SourceIndexer._indexed_config_hash:
+            logging.info('refresh: the index configs changed, indexing all files')
+            SourceIndexer._indexed_files = {}
+        else:
+            # keep the indices, so the unchanged items keep pointing to the same index objects
+            indices = self.indices.all
+            for file_key, (stat_key, file, items) in SourceIndexer._indexed_files.items():
+                if stat_key is not None and file_stat_key(file.path) == stat_key:
+                    known_files[file_key] = file
+
+        previous_paths = set(SourceIndexer._indexed_files)
+        self.indices = indices
+        all_indexed = self._index_all(known_files)
+        current_paths = set(SourceIndexer._indexed_files)
+
+        logging.info('refresh: {0} files added, {1} removed, {2} modified'.format(
+            len(current_paths - previous_paths), len(previous_paths - current_paths),
+            len((current_paths & previous_paths) - set(known_files))))
+        return all_indexed
+
+    def _extract_items_parallel(self, indexed_files, item_indices: Indices):
+        # the files are read and matched in worker processes, in chunks of paths
+        # the returned item records are turned into items in the order of the files
+        logging.info('Extracting items from {0} files using {1} processes'.format(len(indexed_files), self.workers))
+        combined_matcher = self._get_combined_matcher(item_indices)
+        paths = [f.path for f in indexed_files]
+
+        chunk_size = max(1, len(paths) // (self.workers * 4))
+        chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            chunk_records = executor.map(_extract_item_records, chunks, [combined_matcher] * len(chunks))
+            all_records = [records for chunk in chunk_records for records in chunk]
+
+        return [self._items_from_records(f, records, item_indices) for f, records in zip(indexed_files, all_records)]
+
+    @classmethod
+    def _get_index_cache(cls) -> IndexCache:
+        cache_path = os.path.join(cls._get_base_folder_path(), cls._config['index_cache_name'])
+        return IndexCache(cache_path)
+
+    @staticmethod
+    def _item_records(items, item_indices: Indices):
+        # compact records of the items, the index is stored as its position in the item indices
+        index_positions = {id(index): position for position, index in enumerate(item_indices)}
+        return [(index_positions[id(i.index)], i.name, i.line_start, i.line_end, i.properties) for i in items]
+
+    @staticmethod
+    def _items_from_records(indexed_file: IndexedFile, records, item_indices: Indices):
+        item_indices = list(item_indices)
+        return [IndexedItem(name, indexed_file, line_start, line_end, item_indices[position], properties=properties)
+                for position, name, line_start, line_end, properties in records]
+
     @property
     def _print(self):
         return LOG_CONSTANTS.REGION_IDENTIFIER \
@@ -651,17 +1205,32 @@ class SourceIndexer(ItemIndexer, ProjectIndexer, Printable, SourceComponentConta
                + LOG_CONSTANTS.LINE.format(LOG_CONSTANTS.REGION.format('SOUCE_INDEXER END')) \
                + LOG_CONSTANTS.REGION_IDENTIFIER
 
-    def refresh(self):
+    def refresh(self, reindex=True):
+        # resets the scope, when reindexing the added, removed and modified files in the workspace are picked up
+        if reindex:
+            SourceIndexer._all_indexed = self._refresh_all()
         self.indices.refresh()
-        self.scoped = self.all_indexed
+        self.scoped = SourceIndexer._all_indexed
         return self
 
     @property
     def count(self):
-        return len(self.scoped)
+        return len(self)
 
     def __len__(self):
-        return len(self.scoped)
+        self._resolve()
+        if self._selection is not None:
+            return len(self._selection[0])
+        return len(self._scoped)
+
+    def __iter__(self):
+        self.current = 0
+        self._resolve()
+        if self._selection is not None:
+            rows, table = self._selection
+            components = table.components
+            return (components[i] for i in rows)
+        return iter(self._scoped)
 
     def list(self):
         print(LOG_CONSTANTS.REGION.format('LIST INDEXED COMPONENTS'))
@@ -685,11 +1254,9 @@ class SourceIndexer(ItemIndexer, ProjectIndexer, Printable, SourceComponentConta
             pass
 
         if mutable:
-            return_val = self
+            return_val = self.filter(lambda x: x.path == path, mutable)
         else:
-            return_val = self.copy
-
-        return_val = return_val.filter(lambda x: x.path == path, mutable)
+            return_val = self.by_path(path)
         # print(return_val.ok)
         if len(return_val) == 0:
             error_message = 'Trying to get indexed components with path: {0}\n' \
@@ -702,7 +1269,68 @@ class SourceIndexer(ItemIndexer, ProjectIndexer, Printable, SourceComponentConta
         return return_val
 
     def by_path(self, path):
-        return self.filter(lambda x: x.path == path)
+        return self._query(lambda x: x.path == path, lambda table, rows: table.by_path(rows, path),
+                           ('paths', frozenset([path]), frozenset()))
+
+    def by_project(self, project):
+        # the components in the dir of the project (a project or a project name), not in the dir of a sub project
+        table = self._get_table()
+        if isinstance(project, str):
+            projects = [p for p in table.projects if p.name == project]
+        else:
+            projects = [project]
+
+        project_components = None
+
+        def filter_func(comp):
+            # only used when the table can not answer the query, the components are listed on first use
+            nonlocal project_components
+            if project_components is None:
+                project_components = set(table.materialize(table.by_project(table.all_rows, projects)))
+            return comp in project_components
+
+        return self._query(filter_func, lambda table, rows: table.by_project(rows, projects),
+                           ('projects', frozenset(projects)))
+
+    def overlapping(self, line_start, line_end, path=None):
+        # the items sharing a line with the lines from line_start up to and including line_end
+        if path is not None:
+            return self._with_components(self.item_intervals(path).overlapping(line_start, line_end))
+
+        def filter_func(comp):
+            return isinstance(comp, IndexedItem) and comp.line_start <= line_end and comp.line_end >= line_start
+
+        return self._query(filter_func, lambda table, rows: table.overlapping(rows, line_start, line_end),
+                           ('overlapping', line_start, line_end))
+
+    def containing(self, line, path):
+        # the items at the path with the line between their line_start and line_end, outer items first
+        return self._with_components(self.item_intervals(path).containing(line))
+
+    def next_item(self, line, path):
+        return self.item_intervals(path).next(line)
+
+    def previous_item(self, line, path):
+        return self.item_intervals(path).previous(line)
+
+    def item_intervals(self, path) -> ItemIntervals:
+        # the interval tree of the items in scope at the path
+        scoped_components = self.scoped.scoped
+        if SourceIndexer._all_indexed is not None and scoped_components is self._get_table().components:
+            return SourceIndexer._table.intervals(path)
+
+        cached_components, intervals = self._intervals
+        if cached_components is not scoped_components:
+            intervals = {}
+            self._intervals = (scoped_components, intervals)
+        if path not in intervals:
+            intervals[path] = ItemIntervals(list(self.by_path(path).items))
+        return intervals[path]
+
+    def _with_components(self, components: list):
+        instance = self._derive()
+        instance.scoped = Indexed._from_components(components)
+        return instance
 
     @property
     def items(self):
@@ -712,11 +1340,49 @@ class SourceIndexer(ItemIndexer, ProjectIndexer, Printable, SourceComponentConta
             else:
                 return False
 
-        return self.filter(filter_func)
+        return self._query(filter_func, lambda table, rows: table.by_index_type(rows, 'item'), ('index_type', 'item'))
+
+    def search(self, text: str, items=True):
+        # the items (or the files) in scope with the text in their source
+        return self._search(lambda source: text in source, [text], items)
+
+    def search_regex(self, pattern: str, flags=0, items=True):
+        # the items (or the files) in scope with a match of the regex in their source
+        regex = re.compile(pattern, flags)
+        return self._search(lambda source: regex.search(source) is not None, required_literals(pattern, flags), items)
+
+    def _search(self, match_func, literals, items):
+        # the trigram index narrows the files down, only those files and their items are read and matched
+        trigram_index = self._get_trigram_index()
+        candidates = trigram_index.candidates(literals)
+        paths = set()
+        for path in candidates:
+            file = trigram_index.file(path)
+            loaded = file.loaded
+            if match_func(file.source.source):
+                paths.add(path)
+            elif not loaded:
+                file.unload()
+        logging.info('search: {0} candidate files, {1} matching files'.format(len(candidates), len(paths)))
+
+        found = self.items if items else self.files
+        found = found._query(lambda x: x.path in paths, lambda table, rows: table.by_paths(rows, paths))
+        if items:
+            found = found.filter(lambda x: match_func(str(x.source)))
+        return found
+
+    @classmethod
+    def _get_trigram_index(cls) -> TrigramIndex:
+        if cls._trigram_index is None:
+            trigram_index = TrigramIndex()
+            trigram_index.update([c for c in cls._all_indexed._components if isinstance(c, IndexedFile)])
+            SourceIndexer._trigram_index = trigram_index
+        return cls._trigram_index
 
     @property
     def projects(self):
-        return self.filter(lambda x: isinstance(x, Project))
+        return self._query(lambda x: isinstance(x, Project), lambda table, rows: table.by_type(rows, Project),
+                           ('type', Project))
 
     @property
     def components(self):
@@ -730,20 +1396,17 @@ class SourceIndexer(ItemIndexer, ProjectIndexer, Printable, SourceComponentConta
         return self.at_path(script_path)
 
     def at(self, *source_components):
-        # TODO file indexer at DIR
-
+        # the components at the paths of the given components, or anywhere under the given folders
         source_components = Indexed(*source_components)
-        source_components_with_paths = []
-        for c in source_components:
+        paths = set(c.path for c in source_components if not isinstance(c, Folder))
+        dir_paths = set(c.path for c in source_components if isinstance(c, Folder))
+        dir_prefixes = tuple(os.path.join(i, '') for i in dir_paths)
 
-            # for now compare with path, later check folder too
-            for s in self.scoped:
-                if s.is_at(c):
-                    if s not in source_components_with_paths:
-                        source_components_with_paths.append(s)
+        def filter_func(comp):
+            return comp.path in paths or comp.path.startswith(dir_prefixes)
 
-        instance = SourceIndexer(scoped=Indexed(*source_components_with_paths), index_all=False)
-        return instance
+        return self._query(filter_func, lambda table, rows: table.by_paths(rows, paths, dir_paths),
+                           ('paths', frozenset(paths), frozenset(dir_paths)))
 
     def extract_items(self, keep_scope=True):
         # TODO TEST
@@ -759,6 +1422,7 @@ class SourceIndexer(ItemIndexer, ProjectIndexer, Printable, SourceComponentConta
         SourceIndexer.all_indexed = None
         root_dir = project.config.folder.path
         SourceIndexerBase.CALLER_DIR = root_dir
+        SourceIndexerBase._workspace = None
         return SourceIndexer()
 
     @staticmethod
@@ -51,7 +51,7 @@ class SourceManagerBase():
 
         with open(output_path, 'w', encoding='utf8') as output_file:
             output = source_component.source
-            output_file.write(output)
+            output_file.write(str(output))
             return output_path
 
 
@@ -102,6 +102,7 @@ class FileManager(SourceManagerBase):
             backup.do.write_to(name= backup.filename + '.backup')
 
         self.write_to(self.file.folder, self.file.filename, override=True)
+        self.file._saved()
         return self
 
     def replace_with(self, source):
@@ -109,6 +110,7 @@ class FileManager(SourceManagerBase):
             source = Source(source)
 
         self._file._source = source
+        self._file.invalidate()
         return self
 
 
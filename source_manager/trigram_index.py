@@ -0,0 +1,127 @@
+import logging
+import re
+
+from ..utils.utils import file_stat_key
+
+try:
+    import re._parser as sre_parse
+except ImportError:
+    import sre_parse
+
+
+class TrigramIndex():
+    # the trigrams in the source of every indexed file
+    # a search only reads the files that contain all trigrams of the searched text
+
+    def __init__(self):
+        # path -> (stat key, trigrams of the source, file)
+        self._files = {}
+        # trigram -> paths of the files containing it
+        self._postings = {}
+
+    @staticmethod
+    def trigrams(text: str) -> set:
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def __len__(self):
+        return len(self._files)
+
+    def update(self, files):
+        # indexes the added and modified files and drops the files that are not there anymore
+        files_by_path = {}
+        for f in files:
+            files_by_path.setdefault(f.path, f)
+
+        for path in [i for i in self._files if i not in files_by_path]:
+            self._remove(path)
+
+        updated = 0
+        for path, file in files_by_path.items():
+            stat_key = file_stat_key(path)
+            known = self._files.get(path)
+            if known is not None and stat_key is not None and known[0] == stat_key:
+                # keep the file of the last indexing for reading the source
+                self._files[path] = (known[0], known[1], file)
+                continue
+            self.add(file, stat_key)
+            updated += 1
+        logging.info('trigram index: {0} files, {1} (re)indexed'.format(len(self._files), updated))
+
+    def add(self, file, stat_key=None):
+        if file.path in self._files:
+            self._remove(file.path)
+        trigrams = self.trigrams(self.text(file))
+        self._files[file.path] = (stat_key, trigrams, file)
+        for t in trigrams:
+            self._postings.setdefault(t, set()).add(file.path)
+
+    def _remove(self, path):
+        stat_key, trigrams, file = self._files.pop(path)
+        for t in trigrams:
+            paths = self._postings[t]
+            paths.discard(path)
+            if not paths:
+                del self._postings[t]
+
+    @staticmethod
+    def text(file) -> str:
+        # the files that were not loaded are unloaded again after reading
+        loaded = file.loaded
+        text = file.source.source
+        if not loaded:
+            file.unload()
+        return text
+
+    def file(self, path):
+        return self._files[path][2]
+
+    def candidates(self, literals) -> list:
+        # the paths of the files containing all trigrams of the literals
+        trigrams = set()
+        for literal in literals:
+            trigrams |= self.trigrams(literal)
+        if not trigrams:
+            return list(self._files)
+
+        postings = []
+        for t in trigrams:
+            paths = self._postings.get(t)
+            if not paths:
+                return []
+            postings.append(paths)
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for paths in postings[1:]:
+            candidates &= paths
+            if not candidates:
+                break
+        return [i for i in self._files if i in candidates]
+
+
+def required_literals(pattern: str, flags=0) -> list:
+    # strings every match of the regex contains, case insensitive regexes return none
+    if re.compile(pattern, flags).flags & re.IGNORECASE:
+        return []
+    literals = []
+    _literal_runs(sre_parse.parse(pattern, flags), literals)
+    return literals
+
+
+def _literal_runs(parsed, literals):
+    run = []
+    for op, av in parsed:
+        if op is sre_parse.LITERAL:
+            run.append(chr(av))
+            continue
+
+        if run:
+            literals.append(''.join(run))
+            run = []
+        if op is sre_parse.SUBPATTERN:
+            # groups with their own case insensitive flag, (?i:...)
+            if not av[1] & re.IGNORECASE:
+                _literal_runs(av[-1], literals)
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and av[0] >= 1:
+            _literal_runs(av[2], literals)
+    if run:
+        literals.append(''.join(run))
@@ -0,0 +1,13 @@
+import importlib.util
+import os
+import sys
+
+# the repository root is the source_framework package, it is imported under that name
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if 'source_framework' not in sys.modules:
+    spec = importlib.util.spec_from_file_location('source_framework', os.path.join(ROOT_DIR, '__init__.py'),
+                                                  submodule_search_locations=[ROOT_DIR])
+    source_framework = importlib.util.module_from_spec(spec)
+    sys.modules['source_framework'] = source_framework
+    spec.loader.exec_module(source_framework)
@@ -0,0 +1,74 @@
+import tracemalloc
+
+import pytest
+
+from source_framework.models.components import SourceFile, IndexedFile, IndexedItem
+from source_framework.models.indexer import Index
+
+ITEM_COUNT = 10000
+# bytes per item, including the tuple of the property values and the list slot holding the item
+MAX_ITEM_SIZE = 200
+
+
+def _indexed_file(tmp_path):
+    path = tmp_path / 'a.script.py'
+    path.write_text('def alpha():\n    pass\n\n\ndef beta():\n    pass\n')
+    file_index = Index('file', SourceFile('py.file.index', str(tmp_path / 'py.file.index'), source=''),
+                       name='py', config={'identifier': '.script.py'})
+    return IndexedFile('a', str(path), file_index)
+
+
+def _item_index(tmp_path):
+    return Index('item', SourceFile('func.item.index', str(tmp_path / 'func.item.index'), source=''),
+                 name='func', config={'identifier': {'start': 'def {name}('}})
+
+
+# the names and the (small, cached) line numbers are shared, so only the items themselves are measured
+NAMES = ['item_{0}'.format(i) for i in range(100)]
+
+
+def _items(indexed_file, index, count):
+    return [IndexedItem(NAMES[i % 100], indexed_file, i % 200, i % 200 + 1, index,
+                        properties={'kind': 'def', 'indent': ''}) for i in range(count)]
+
+
+def test_items_have_no_instance_dict(tmp_path):
+    item = _items(_indexed_file(tmp_path), _item_index(tmp_path), 1)[0]
+    # not hasattr, unknown attributes fall through to the indexed file
+    with pytest.raises(AttributeError):
+        object.__getattribute__(item, '__dict__')
+
+
+def test_items_share_the_property_layout(tmp_path):
+    first, second = _items(_indexed_file(tmp_path), _item_index(tmp_path), 2)
+    assert first._layout is second._layout
+
+
+def test_item_memory(tmp_path):
+    indexed_file = _indexed_file(tmp_path)
+    index = _item_index(tmp_path)
+    # the item names and the layout exist before measuring
+    _items(indexed_file, index, 100)
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        items = _items(indexed_file, index, ITEM_COUNT)
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    assert len(items) == ITEM_COUNT
+    assert (after - before) / ITEM_COUNT <= MAX_ITEM_SIZE
+
+
+def test_item_attributes(tmp_path):
+    indexed_file = _indexed_file(tmp_path)
+    item = _items(indexed_file, _item_index(tmp_path), 1)[0]
+
+    assert item.kind == 'def'
+    assert item.indent == ''
+    assert item.properties == {'kind': 'def', 'indent': ''}
+    # attributes that are not properties fall through to the indexed file
+    assert item.loaded == indexed_file.loaded
+    assert item.file is indexed_file
@@ -2,6 +2,15 @@ import inspect
 import os, re, json, urllib
 import logging
 
+def file_stat_key(path):
+    # mtime and size of the file, a changed key means the file changed, None when the file is not there
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
 # SOURCE ITERATOR
 def get_parent(path):
     parent, current = os.path.split(path)
@@ -0,0 +1,277 @@
+import os
+import re
+import logging
+
+
+# WORKSPACE SCANNER
+class SuffixTrie():
+    # trie over the reversed identifiers
+    # so all identifiers can be matched against a name in one pass from the end of the name
+
+    _END = object()
+
+    def __init__(self, suffixes):
+        self._root = {}
+        self.suffixes = list(suffixes)
+        for suffix in self.suffixes:
+            node = self._root
+            for char in reversed(suffix):
+                node = node.setdefault(char, {})
+            node[self._END] = suffix
+
+    def match(self, name: str):
+        # returns all the suffixes the name ends with
+        matches = []
+        node = self._root
+        for char in reversed(name):
+            node = node.get(char)
+            if node is None:
+                break
+            if self._END in node:
+                matches.append(node[self._END])
+        # an empty identifier matches every name
+        if self._END in self._root:
+            matches.append(self._root[self._END])
+        return matches
+
+
+# IGNORE RULES
+class GitignoreRules():
+    # the patterns of one .gitignore file, relative to the dir the file is in
+
+    def __init__(self, lines, base_dir=''):
+        self.base_dir = base_dir
+        self.rules = []
+        for line in lines:
+            line = line.rstrip('\n').rstrip()
+            if not line or line.startswith('#'):
+                continue
+            negate = line.startswith('!')
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith('/')
+            line = line.rstrip('/')
+            # patterns with a slash are relative to the .gitignore dir, others match the name at any depth
+            anchored = '/' in line
+            line = line.lstrip('/')
+            regex = re.compile('^' + self._translate(line) + '$')
+            self.rules.append((regex, negate, dir_only, anchored))
+
+    @staticmethod
+    def _translate(pattern):
+        regex = ''
+        i = 0
+        while i < len(pattern):
+            if pattern.startswith('**/', i):
+                regex += '(?:.*/)?'
+                i += 3
+            elif pattern.startswith('**', i):
+                regex += '.*'
+                i += 2
+            elif pattern[i] == '*':
+                regex += '[^/]*'
+                i += 1
+            elif pattern[i] == '?':
+                regex += '[^/]'
+                i += 1
+            elif pattern[i] == '[' and ']' in pattern[i + 1:]:
+                end = pattern.index(']', i + 1)
+                regex += '[' + pattern[i + 1:end].replace('!', '^', 1) + ']'
+                i = end + 1
+            else:
+                regex += re.escape(pattern[i])
+                i += 1
+        return regex
+
+    def match(self, rel_path, name, is_dir):
+        # returns True (ignored), False (re included) or None (no rule applies)
+        if self.base_dir:
+            if not rel_path.startswith(self.base_dir + '/'):
+                return None
+            rel_path = rel_path[len(self.base_dir) + 1:]
+
+        result = None
+        for regex, negate, dir_only, anchored in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(rel_path if anchored else name):
+                result = not negate
+        return result
+
+    @classmethod
+    def from_file(cls, path, base_dir=''):
+        try:
+            with open(path, encoding='utf8') as f:
+                return cls(f.readlines(), base_dir)
+        except (OSError, UnicodeDecodeError) as e:
+            logging.info('Could not read gitignore: {0}, {1}'.format(path, e))
+            return None
+
+
+class IgnoreRules():
+    # regexes are searched in the name of the file or dir, or in the path relative to the workspace
+    # when the regex contains a slash. excludes only apply to files, dir excludes prune the whole dir during the walk
+
+    GITIGNORE = '.gitignore'
+
+    def __init__(self, exclude: list = None, exclude_dirs: list = None, gitignore=False):
+        self.exclude_patterns = list(exclude or [])
+        self.exclude_dirs_patterns = list(exclude_dirs or [])
+        self.exclude = [re.compile(i) for i in self.exclude_patterns]
+        self.exclude_dirs = [re.compile(i) for i in self.exclude_dirs_patterns]
+        self.gitignore = gitignore
+
+    @classmethod
+    def from_config(cls, config: dict):
+        if not config:
+            return cls()
+        return cls(exclude=config.get('exclude'), exclude_dirs=config.get('exclude_dirs'),
+                   gitignore=config.get('gitignore', False))
+
+    @property
+    def config(self):
+        return {
+            'exclude': self.exclude_patterns,
+            'exclude_dirs': self.exclude_dirs_patterns,
+            'gitignore': self.gitignore
+        }
+
+    @staticmethod
+    def _search(patterns, rel_path, name):
+        for p in patterns:
+            if p.search(rel_path if '/' in p.pattern else name):
+                return True
+        return False
+
+    def ignores(self, rel_path, name, is_dir, gitignores=()):
+        if not is_dir and self._search(self.exclude, rel_path, name):
+            return True
+        if is_dir and self._search(self.exclude_dirs, rel_path, name):
+            return True
+
+        ignored = False
+        for g in gitignores:
+            result = g.match(rel_path, name, is_dir)
+            if result is not None:
+                ignored = result
+        return ignored
+
+    def ignores_path(self, path, root_dir):
+        # check a path found without these rules, so every parent dir is checked as well
+        rel_path = os.path.relpath(path, root_dir)
+        if rel_path.startswith('..'):
+            return False
+        parts = rel_path.split(os.sep)
+        for i in range(len(parts)):
+            is_dir = i < len(parts) - 1
+            if self.ignores('/'.join(parts[:i + 1]), parts[i], is_dir):
+                return True
+        return False
+
+    def __bool__(self):
+        return bool(self.exclude or self.exclude_dirs or self.gitignore)
+
+
+def scandir_walk(root_dir, ignore: IgnoreRules = None, _rel_dir='', _gitignores=()):
+    # same as os.walk (top down, not following symlinks)
+    # but also yields the dir entries, so the entry types come from the scandir call
+    # ignored dirs are pruned and never visited
+    try:
+        scandir_iterator = os.scandir(root_dir)
+    except OSError as e:
+        logging.info('Could not scan dir: {0}, {1}'.format(root_dir, e))
+        return
+
+    if ignore is not None and ignore.gitignore:
+        gitignore_path = os.path.join(root_dir, IgnoreRules.GITIGNORE)
+        if os.path.isfile(gitignore_path):
+            gitignore_rules = GitignoreRules.from_file(gitignore_path, _rel_dir)
+            if gitignore_rules is not None:
+                _gitignores = (*_gitignores, gitignore_rules)
+
+    dirs = []
+    files = []
+    with scandir_iterator:
+        for entry in scandir_iterator:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+
+            if ignore:
+                rel_path = _rel_dir + '/' + entry.name if _rel_dir else entry.name
+                if ignore.ignores(rel_path, entry.name, is_dir, _gitignores):
+                    continue
+
+            if is_dir:
+                dirs.append(entry)
+            else:
+                files.append(entry)
+
+    yield root_dir, dirs, files
+
+    for entry in dirs:
+        try:
+            if entry.is_symlink():
+                continue
+        except OSError:
+            continue
+        rel_dir = _rel_dir + '/' + entry.name if _rel_dir else entry.name
+        yield from scandir_walk(entry.path, ignore, rel_dir, _gitignores)
+
+
+class WorkspaceSnapshot():
+    # the result of one walk over the workspace
+    # the index configs and the indexed files are both looked up in the snapshot, so init walks the disk once
+
+    def __init__(self, root_dir, ignore: IgnoreRules = None):
+        self.root_dir = root_dir
+        self.ignore = ignore
+        # (path, dir path relative to the root dir, dir names, file names) in walk order
+        self.dirs = []
+        for path, dirs, files in scandir_walk(root_dir, ignore):
+            rel_dir = os.path.relpath(path, root_dir).replace(os.sep, '/')
+            if rel_dir == '.':
+                rel_dir = ''
+            self.dirs.append((path, rel_dir, [i.name for i in dirs], [i.name for i in files]))
+        logging.info('workspace snapshot of {0}: {1} dirs, {2} entries'.format(root_dir, len(self.dirs), len(self)))
+
+    @classmethod
+    def scan(cls, root_dir, ignore: IgnoreRules = None):
+        return cls(root_dir, ignore)
+
+    def __len__(self):
+        return sum(len(d) + len(f) for p, r, d, f in self.dirs)
+
+    def walk(self, ignore: IgnoreRules = None):
+        # replays the walk from memory, extra ignore rules prune the dirs as the walk on disk would
+        pruned = set()
+        for path, rel_dir, dirs, files in self.dirs:
+            if rel_dir and (rel_dir in pruned or rel_dir.rpartition('/')[0] in pruned):
+                pruned.add(rel_dir)
+                continue
+            if ignore:
+                def rel_path(name):
+                    return rel_dir + '/' + name if rel_dir else name
+
+                kept_dirs = []
+                for name in dirs:
+                    if ignore.ignores(rel_path(name), name, True):
+                        pruned.add(rel_path(name))
+                    else:
+                        kept_dirs.append(name)
+                dirs = kept_dirs
+                files = [i for i in files if not ignore.ignores(rel_path(i), i, False)]
+            yield path, dirs, files
+
+    def find_paths_by_identifiers(self, identifiers, ignore: IgnoreRules = None):
+        # every entry name is matched against all identifiers at once
+        trie = SuffixTrie(set(identifiers))
+        matches_by_identifier = {k: [] for k in identifiers}
+
+        for path, dirs, files in self.walk(ignore):
+            for name in dirs + files:
+                for identifier in trie.match(name):
+                    matches_by_identifier[identifier].append(os.path.join(path, name))
+
+        return matches_by_identifier